@@ -6,6 +6,9 @@ from sqlalchemy import pool
 from app.database.base import Base
 from app.models.document import Document
 from app.models.transaction import Transaction
+from app.models.job import Job
+from app.models.artifact import DocumentArtifact
+from app.models.stage_event import DocumentStageEvent, DocumentStageTiming
 
 from alembic import context
 
@@ -0,0 +1,33 @@
+"""document artifacts
+
+Revision ID: 8f41c6e2d5b7
+Revises: 3b9d2c71f0a4
+Create Date: 2026-10-18 11:40:27.530911
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f41c6e2d5b7'
+down_revision: Union[str, None] = '3b9d2c71f0a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('document_artifacts',
+    sa.Column('document_id', sa.String(), nullable=False),
+    sa.Column('stage', sa.String(), nullable=False),
+    sa.Column('payload', sa.LargeBinary(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('document_id', 'stage')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('document_artifacts')
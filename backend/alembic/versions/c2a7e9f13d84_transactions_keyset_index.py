@@ -0,0 +1,25 @@
+"""transactions keyset index
+
+Revision ID: c2a7e9f13d84
+Revises: 8f41c6e2d5b7
+Create Date: 2026-10-18 13:05:44.208617
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2a7e9f13d84'
+down_revision: Union[str, None] = '8f41c6e2d5b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_transactions_document_date_id', 'transactions', ['document_id', 'date', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_transactions_document_date_id', table_name='transactions')
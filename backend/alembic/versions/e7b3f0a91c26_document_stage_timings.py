@@ -0,0 +1,41 @@
+"""document stage timings
+
+Revision ID: e7b3f0a91c26
+Revises: d5e1a2b7c9f0
+Create Date: 2026-10-18 15:03:51.287640
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b3f0a91c26'
+down_revision: Union[str, None] = 'd5e1a2b7c9f0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('document_stage_timings',
+    sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), autoincrement=True, nullable=False),
+    sa.Column('document_id', sa.String(), nullable=False),
+    sa.Column('stage', sa.String(), nullable=False),
+    sa.Column('bank', sa.String(), nullable=True),
+    sa.Column('wall_ms', sa.Float(), nullable=False),
+    sa.Column('cpu_ms', sa.Float(), nullable=False),
+    sa.Column('pages', sa.Integer(), nullable=True),
+    sa.Column('transactions', sa.Integer(), nullable=True),
+    sa.Column('bytes', sa.BigInteger(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_document_stage_timings_document_id'), 'document_stage_timings', ['document_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_document_stage_timings_document_id'), table_name='document_stage_timings')
+    op.drop_table('document_stage_timings')
@@ -0,0 +1,51 @@
+"""timestamps with time zone
+
+Revision ID: f3c8a1d92e47
+Revises: e7b3f0a91c26
+Create Date: 2026-10-18 18:12:40.513208
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3c8a1d92e47'
+down_revision: Union[str, None] = 'e7b3f0a91c26'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# La aplicación escribe datetime.now(timezone.utc); asyncpg no acepta valores con zona en columnas sin zona
+COLUMNS = [
+    ('documents', 'created_at', False),
+    ('documents', 'updated_at', False),
+    ('documents', 'processed_at', True),
+    ('jobs', 'run_after', False),
+    ('jobs', 'locked_until', True),
+    ('jobs', 'created_at', False),
+    ('jobs', 'updated_at', False),
+    ('document_artifacts', 'created_at', False),
+    ('document_stage_events', 'created_at', False),
+    ('document_stage_timings', 'created_at', False),
+]
+
+
+def upgrade() -> None:
+    # Los valores guardados hasta ahora ya son UTC sin zona
+    for table, column, nullable in COLUMNS:
+        op.alter_column(table, column,
+                        existing_type=sa.DateTime(),
+                        type_=sa.DateTime(timezone=True),
+                        existing_nullable=nullable,
+                        postgresql_using=f"{column} AT TIME ZONE 'UTC'")
+
+
+def downgrade() -> None:
+    for table, column, nullable in COLUMNS:
+        op.alter_column(table, column,
+                        existing_type=sa.DateTime(timezone=True),
+                        type_=sa.DateTime(),
+                        existing_nullable=nullable,
+                        postgresql_using=f"{column} AT TIME ZONE 'UTC'")
@@ -1,58 +1,227 @@
 # app/api/main.py
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, BackgroundTasks
+import json, os, uuid, zipfile
+from typing import Dict, List, Optional, Tuple
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, BackgroundTasks, Query
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.core.db import get_db, SessionLocal
-from app.core.executor import EXECUTOR
-from app.core.storage import save_upload, hash_file
-from app.core.state import set_status
+from starlette.concurrency import run_in_threadpool
+from app.api.results import encode_cursor, row_to_dict, transactions_stmt
+from app.core.db import SessionLocal, async_engine, engine, get_async_db, get_db
+from app.core.events import BROKER, start_pg_listener, status_event
+from app.core.metrics import PROMETHEUS_AVAILABLE, metrics_payload
+from app.core.queue import enqueue, enqueue_many
+from app.core.storage import STORAGE, StagedUpload, stage_stream, stage_upload
 from app.models.document import Document, DocStatus
-from app.pipeline.stages import run_pipeline
+from app.models.job import Job, JobStatus
+from app.pipeline.artifacts import ARTIFACT_STAGES, delete_artifacts_from
 
 app = FastAPI()
 
+
+@app.on_event("startup")
+def _start_status_listener():
+    # Los workers pueden correr en otros nodos: sus cambios llegan por LISTEN/NOTIFY
+    if engine.dialect.name == "postgresql":
+        start_pg_listener(engine)
+
 @app.get("/health")
 def health_check():
     return {"status": "healthy", "service": "banky-api"}
 
-def _process_document(doc_id: str):
-    db = SessionLocal()
-    try:
-        doc = db.get(Document, doc_id)
-        run_pipeline(db, doc)
-        set_status(db, doc_id, DocStatus.DONE)
-    except Exception as e:
-        set_status(db, doc_id, DocStatus.FAILED, error=str(e))
-    finally:
-        db.close()
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics (stage timings, OCR pages) in the text exposition format"""
+    if not PROMETHEUS_AVAILABLE:
+        raise HTTPException(503, "prometheus_client not installed")
+    body, content_type = metrics_payload()
+    return Response(body, media_type=content_type)
 
 
 @app.post("/upload")
-async def upload(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    path, ctype = save_upload(file, name=file.filename or "default_filename")
-    fhash = hash_file(path)
-    print(fhash)
-    existing = db.query(Document).filter_by(file_hash=fhash).first()
-    
-    
+async def upload(file: UploadFile = File(...), db: AsyncSession = Depends(get_async_db)):
+    staged = await stage_upload(file)
+
+    existing = await _find_by_hash(db, staged.sha256)
     if existing:
+        await run_in_threadpool(STORAGE.discard, staged)
         return {"doc_id": existing.id, "status": existing.status, "cached": True}
 
-    doc = Document(filename=file.filename, content_type=ctype, storage_path=path, file_hash=fhash)
+    key = STORAGE.key_for(staged.sha256)
+    # La copia al storage es I/O bloqueante: va al threadpool
+    await run_in_threadpool(STORAGE.put_file, staged.path, key)
+    doc = Document(filename=file.filename, content_type=staged.content_type, storage_path=key, file_hash=staged.sha256)
     db.add(doc)
-    db.commit()
-    db.refresh(doc)
+    try:
+        await db.flush()
+        # El job se guarda en la misma transacción que el documento
+        enqueue(db, doc.id)
+        await db.commit()
+    except IntegrityError:
+        # Otra subida concurrente del mismo archivo ganó la carrera
+        await db.rollback()
+        existing = await _find_by_hash(db, staged.sha256)
+        return {"doc_id": existing.id, "status": existing.status, "cached": True}
 
-    EXECUTOR.submit(_process_document, doc.id)
     return {"doc_id": doc.id, "status": doc.status}
 
 
+async def _find_by_hash(db: AsyncSession, file_hash: str) -> Optional[Document]:
+    result = await db.execute(select(Document).where(Document.file_hash == file_hash).limit(1))
+    return result.scalars().first()
 
 
+ZIP_CONTENT_TYPES = ("application/zip", "application/x-zip-compressed")
 
 
-@app.get("/status/{doc_id}")
-def status(doc_id: str, db: Session = Depends(get_db)):
+def _is_zip(file: UploadFile) -> bool:
+    return file.content_type in ZIP_CONTENT_TYPES or (file.filename or "").lower().endswith(".zip")
+
+
+def _stage_zip(file: UploadFile) -> List[Tuple[str, StagedUpload]]:
+    """Stream every PDF entry of an uploaded ZIP into staging, hashing as it goes"""
+    staged = []
+    try:
+        with zipfile.ZipFile(file.file) as archive:
+            for info in archive.infolist():
+                name = info.filename
+                if info.is_dir() or name.startswith("__MACOSX/") or not name.lower().endswith(".pdf"):
+                    continue
+                with archive.open(info) as src:
+                    staged.append((os.path.basename(name), stage_stream(src, "application/pdf")))
+    except zipfile.BadZipFile:
+        for _, item in staged:
+            STORAGE.discard(item)
+        raise HTTPException(400, f"invalid ZIP archive: {file.filename}")
+    return staged
+
+
+@app.post("/upload/batch")
+async def upload_batch(files: List[UploadFile] = File(...), db: Session = Depends(get_db)):
+    """
+    Ingest many statements at once: multipart file lists and/or ZIP archives.
+    The whole batch is deduplicated with one IN query, new documents are
+    inserted in bulk and all of them are queued in a single step.
+    """
+    items: List[Tuple[str, StagedUpload]] = []
+    try:
+        for file in files:
+            if _is_zip(file):
+                items.extend(await run_in_threadpool(_stage_zip, file))
+            else:
+                items.append((file.filename or "default_filename", await stage_upload(file)))
+    except BaseException:
+        # Un archivo inválido a mitad del lote no deja los anteriores en staging
+        await run_in_threadpool(_discard_staged, items)
+        raise
+    return await run_in_threadpool(_register_batch, db, items)
+
+
+def _discard_staged(items: List[Tuple[str, StagedUpload]]) -> None:
+    for _, staged in items:
+        STORAGE.discard(staged)
+
+
+def _existing_by_hash(db: Session, hashes) -> Dict[str, Tuple[str, DocStatus]]:
+    rows = db.execute(
+        select(Document.id, Document.file_hash, Document.status).where(Document.file_hash.in_(hashes))
+    )
+    return {fhash: (doc_id, status) for doc_id, fhash, status in rows}
+
+
+def _register_batch(db: Session, items: List[Tuple[str, StagedUpload]]) -> dict:
+    stored: Dict[str, str] = {}  # hash -> key de los objetos que creó este lote
+    try:
+        known = _existing_by_hash(db, {staged.sha256 for _, staged in items})
+        cached = set(known)
+
+        new_rows = []
+        for filename, staged in items:
+            if staged.sha256 in known:
+                STORAGE.discard(staged)
+                continue
+            key = STORAGE.key_for(staged.sha256)
+            created = not STORAGE.exists(key)
+            STORAGE.put_file(staged.path, key)
+            if created:
+                stored[staged.sha256] = key
+            doc_id = str(uuid.uuid4())
+            # Duplicados dentro del mismo lote apuntan al primer documento
+            known[staged.sha256] = (doc_id, DocStatus.INGESTED)
+            new_rows.append({"id": doc_id, "filename": filename, "content_type": staged.content_type,
+                             "storage_path": key, "file_hash": staged.sha256})
+
+        while new_rows:
+            try:
+                db.execute(insert(Document), new_rows)
+                enqueue_many(db, [row["id"] for row in new_rows])
+                db.commit()
+                break
+            except IntegrityError:
+                # Otra subida concurrente registró alguno de los archivos: usar ese documento
+                db.rollback()
+                taken = _existing_by_hash(db, {row["file_hash"] for row in new_rows})
+                known.update(taken)
+                cached.update(taken)
+                new_rows = [row for row in new_rows if row["file_hash"] not in taken]
+    except Exception:
+        db.rollback()
+        _discard_staged(items)
+        _delete_unreferenced(db, stored)
+        raise
+
+    documents = []
+    for filename, staged in items:
+        doc_id, status = known[staged.sha256]
+        documents.append({"filename": filename, "doc_id": doc_id, "status": status,
+                          "cached": staged.sha256 in cached})
+    return {"documents": documents, "queued": len(new_rows)}
+
+
+def _delete_unreferenced(db: Session, stored: Dict[str, str]) -> None:
+    """Remove objects a failed batch stored, unless some document points to them"""
+    if not stored:
+        return
+    try:
+        referenced = _existing_by_hash(db, set(stored))
+    except Exception as e:
+        print(f"Could not check stored objects of a failed batch, keeping them: {e}")
+        return
+    for fhash, key in stored.items():
+        if fhash not in referenced:
+            STORAGE.delete(key)
+
+
+@app.post("/reprocess/{doc_id}")
+def reprocess(doc_id: str, from_stage: DocStatus = DocStatus.PARSED, db: Session = Depends(get_db)):
+    """Rerun the pipeline from `from_stage` on, reusing the artifacts of earlier stages"""
+    if from_stage not in ARTIFACT_STAGES:
+        raise HTTPException(400, f"from_stage must be one of {[s.value for s in ARTIFACT_STAGES]}")
     doc = db.get(Document, doc_id)
+    if not doc:
+        raise HTTPException(404, "doc not found")
+    active = db.query(Job).filter(Job.document_id == doc_id,
+                                  Job.status.in_([JobStatus.QUEUED, JobStatus.RUNNING])).first()
+    if active:
+        raise HTTPException(409, "document is already being processed")
+
+    delete_artifacts_from(db, doc_id, from_stage)
+    idx = ARTIFACT_STAGES.index(from_stage)
+    doc.status = ARTIFACT_STAGES[idx - 1] if idx else DocStatus.INGESTED
+    doc.error = None
+    doc.processed_at = None
+    enqueue(db, doc_id)
+    db.commit()
+    return {"doc_id": doc.id, "status": doc.status, "from_stage": from_stage}
+
+
+@app.get("/status/{doc_id}")
+async def status(doc_id: str, db: AsyncSession = Depends(get_async_db)):
+    doc = await db.get(Document, doc_id)
     if not doc:
         raise HTTPException(404, "doc not found")
     return {"doc_id": doc.id, "status": doc.status, "error": doc.error}
@@ -63,16 +232,106 @@ def status(doc_id: str, db: Session = Depends(get_db)):
 
 
 
+class BatchStatusRequest(BaseModel):
+    doc_ids: List[str]
+
+
+def _statuses(db: Session, doc_ids: List[str]) -> Dict[str, dict]:
+    rows = db.execute(
+        select(Document.id, Document.status, Document.error).where(Document.id.in_(doc_ids))
+    )
+    return {doc_id: status_event(doc_id, status, error) for doc_id, status, error in rows}
+
+
+@app.post("/status/batch")
+def status_batch(req: BatchStatusRequest, db: Session = Depends(get_db)):
+    """Status of many documents with a single query"""
+    found = _statuses(db, req.doc_ids)
+    return {"statuses": list(found.values()), "missing": [d for d in req.doc_ids if d not in found]}
+
+
+TERMINAL_STATUSES = (DocStatus.DONE.value, DocStatus.FAILED.value)
+
+
+def _sse(evt: dict) -> str:
+    return f"event: status\ndata: {json.dumps(evt)}\n\n"
+
+
+def _snapshot(doc_ids: List[str]) -> Dict[str, dict]:
+    db = SessionLocal()
+    try:
+        return _statuses(db, doc_ids)
+    finally:
+        db.close()
+
+
+@app.get("/events/status")
+async def status_events(doc_id: List[str] = Query(...)):
+    """
+    Server-Sent Events with the status transitions of one or more documents
+    (?doc_id=a&doc_id=b). Sends the current status first, then every change,
+    and closes once all documents reach DONE or FAILED.
+    """
+    doc_ids = list(dict.fromkeys(doc_id))
+
+    async def stream():
+        # Suscribirse antes de leer el estado actual para no perder transiciones
+        with BROKER.subscribe(doc_ids) as sub:
+            current = await run_in_threadpool(_snapshot, doc_ids)
+            pending = set(doc_ids)
+            for did in doc_ids:
+                if did not in current:
+                    yield f"event: error\ndata: {json.dumps({'doc_id': did, 'error': 'doc not found'})}\n\n"
+                    pending.discard(did)
+                    continue
+                yield _sse(current[did])
+                if current[did]["status"] in TERMINAL_STATUSES:
+                    pending.discard(did)
+            while pending:
+                evt = await sub.get(timeout=15)
+                if evt is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield _sse(evt)
+                if evt["status"] in TERMINAL_STATUSES:
+                    pending.discard(evt["doc_id"])
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+RESULT_READY = (DocStatus.DONE, DocStatus.VALIDATED, DocStatus.PARSED, DocStatus.NORMALIZED)
+
+
 @app.get("/result/{doc_id}")
-def result(doc_id: str, db: Session = Depends(get_db)):
-    from app.models.transaction import Transaction
-    doc = db.get(Document, doc_id)
-    if not doc or doc.status not in (DocStatus.DONE, DocStatus.VALIDATED, DocStatus.PARSED, DocStatus.NORMALIZED):
+async def result(doc_id: str, limit: int = Query(500, ge=1, le=5000), cursor: Optional[str] = None,
+                 format: str = Query("json", pattern="^(json|ndjson)$"), db: AsyncSession = Depends(get_async_db)):
+    """
+    Transactions of a document, paginated by (date, id).
+    format=json returns one page plus `next_cursor`; format=ndjson streams every
+    row after `cursor` from a server-side cursor, one JSON object per line.
+    """
+    doc = await db.get(Document, doc_id)
+    if not doc or doc.status not in RESULT_READY:
         raise HTTPException(404, "result not ready")
-    txs = db.query(Transaction).filter_by(document_id=doc_id).all()
+    try:
+        stmt = transactions_stmt(doc_id, cursor, None if format == "ndjson" else limit + 1)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    if format == "ndjson":
+        return StreamingResponse(_stream_rows(stmt), media_type="application/x-ndjson")
+
+    rows = (await db.execute(stmt)).all()
+    next_cursor = encode_cursor(rows[limit - 1].date, rows[limit - 1].id) if len(rows) > limit else None
     return {"document": doc.filename, "bank": doc.bank_code, "status": doc.status,
-            "transactions": [
-                dict(id=t.id, date=str(t.date), description=t.description, amount=float(t.amount or 0),
-                     currency=t.currency, type=t.type, balance=float(t.balance or 0) if t.balance else None)
-                for t in txs
-            ]}
+            "transactions": [row_to_dict(row) for row in rows[:limit]],
+            "next_cursor": next_cursor}
+
+
+async def _stream_rows(stmt):
+    # Conexión propia: la sesión del request se cierra antes de terminar el streaming
+    async with async_engine.connect() as conn:
+        result = await conn.stream(stmt, execution_options={"yield_per": 1000})
+        async for row in result:
+            yield json.dumps(row_to_dict(row)) + "\n"
@@ -0,0 +1,63 @@
+# app/api/results.py
+"""
+Keyset pagination over a document's transactions, ordered by (date, id).
+Rows are read with Core selects (no ORM hydration); the cursor is an opaque
+token holding the (date, id) of the last row returned.
+"""
+import base64
+import json
+from datetime import date
+from typing import Optional, Tuple
+
+from sqlalchemy import and_, or_, select
+
+from app.models.transaction import Transaction
+
+RESULT_COLUMNS = (
+    Transaction.id, Transaction.date, Transaction.description, Transaction.amount,
+    Transaction.currency, Transaction.type, Transaction.balance,
+)
+
+
+def encode_cursor(tx_date: Optional[date], tx_id: str) -> str:
+    raw = json.dumps([tx_date.isoformat() if tx_date else None, tx_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[date], str]:
+    """Raises ValueError on malformed cursors"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        tx_date, tx_id = json.loads(base64.urlsafe_b64decode(padded))
+        return (date.fromisoformat(tx_date) if tx_date else None), str(tx_id)
+    except Exception as e:
+        raise ValueError(f"invalid cursor: {e}") from None
+
+
+def transactions_stmt(doc_id: str, cursor: Optional[str] = None, limit: Optional[int] = None):
+    """
+    SELECT for one page of transactions after `cursor`, backed by the
+    (document_id, date, id) index. NULL dates sort last.
+    """
+    stmt = select(*RESULT_COLUMNS).where(Transaction.document_id == doc_id)
+    if cursor:
+        after_date, after_id = decode_cursor(cursor)
+        if after_date is None:
+            # Ya estamos en la cola de fechas NULL
+            stmt = stmt.where(Transaction.date.is_(None), Transaction.id > after_id)
+        else:
+            stmt = stmt.where(or_(
+                Transaction.date > after_date,
+                and_(Transaction.date == after_date, Transaction.id > after_id),
+                Transaction.date.is_(None),
+            ))
+    stmt = stmt.order_by(Transaction.date.asc().nulls_last(), Transaction.id.asc())
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def row_to_dict(row) -> dict:
+    return dict(id=row.id, date=str(row.date), description=row.description, amount=float(row.amount or 0),
+                currency=row.currency, type=row.type.value if row.type else None,
+                balance=float(row.balance or 0) if row.balance else None)
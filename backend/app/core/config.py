@@ -1,7 +1,7 @@
 # app/core/config.py
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import AnyUrl
-from typing import Optional
+from typing import Dict, Optional
 
 from functools import lru_cache
 import os
@@ -19,6 +19,79 @@ class Settings(BaseSettings):
     DB_USER: str = "user"
     DB_PASSWORD: str = "pass"
     DB_NAME: str = "bankdb"
+    # Engine síncrono (workers del pipeline, endpoints de lote)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    # Engine async (asyncpg) para /upload, /status y /result
+    ASYNC_DATABASE_URL: Optional[str] = None
+    ASYNC_DB_POOL_SIZE: int = 20
+    ASYNC_DB_MAX_OVERFLOW: int = 20
+
+    # --- Job queue (tabla jobs) ---
+    QUEUE_VISIBILITY_TIMEOUT_SEC: int = 600
+    QUEUE_MAX_ATTEMPTS: int = 5
+    QUEUE_RETRY_BACKOFF_SEC: float = 30.0
+    QUEUE_RETRY_BACKOFF_MAX_SEC: float = 3600.0
+    QUEUE_POLL_INTERVAL_SEC: float = 2.0
+
+    # --- Stage journal ---
+    # True: las transiciones intermedias se escriben junto con el estado final (un commit por documento);
+    # False: cada etapa confirma sus artefactos, así un fallo se reanuda desde la última etapa terminada
+    STAGE_JOURNAL_BATCH: bool = True
+
+    # --- Storage ---
+    # "local" o "s3" (AWS S3 / MinIO)
+    STORAGE_BACKEND: str = "local"
+    STORAGE_LOCAL_ROOT: str = "s3"
+    S3_BUCKET: str = "banky"
+    S3_PREFIX: str = ""
+    S3_ENDPOINT_URL: Optional[str] = None
+    S3_REGION: Optional[str] = None
+    S3_ACCESS_KEY_ID: Optional[str] = None
+    S3_SECRET_ACCESS_KEY: Optional[str] = None
+    # Caché local de lectura en los workers
+    STORAGE_CACHE_DIR: str = ".cache/storage"
+    STORAGE_CACHE_MAX_BYTES: int = 2 * 1024 * 1024 * 1024
+
+    # --- Pipeline executor ---
+    # "thread" (default, dev) o "process" para usar todos los cores
+    EXECUTOR_BACKEND: str = "thread"
+    EXECUTOR_MAX_WORKERS: int = 2
+    # Recicla cada proceso tras N documentos para contener el crecimiento de memoria de pdfplumber
+    EXECUTOR_MAX_TASKS_PER_CHILD: Optional[int] = 50
+    WORKER_DB_POOL_SIZE: int = 2
+
+    # --- Text extraction ---
+    # "fast" (PyMuPDF), "layout" (pdfplumber) o "auto" (PyMuPDF + pdfplumber por página cuando hace falta)
+    EXTRACTION_STRATEGY: str = "auto"
+
+    # --- OCR ---
+    # Procesos para OCR por página; con 1 se hace en serie dentro del worker.
+    # La concurrencia total es EXECUTOR_MAX_WORKERS x OCR_MAX_WORKERS.
+    OCR_MAX_WORKERS: int = 4
+    # 144 DPI = zoom 2x. Por banco, p.ej. OCR_DPI_BY_BANK='{"BBVA": 108}' (1.5x)
+    OCR_DPI: int = 144
+    OCR_DPI_BY_BANK: Dict[str, int] = {}
+
+    # --- Page text cache (pdfplumber/OCR) ---
+    PAGE_CACHE_ENABLED: bool = True
+    PAGE_CACHE_DIR: str = ".cache/pages"
+    PAGE_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+
+    # --- Bank templates ---
+    # Directorio de plantillas declarativas (*.json, *.yaml); por defecto app/pipeline/bank_templates
+    TEMPLATES_DIR: Optional[str] = None
+    # Cada cuántos segundos se revisan cambios en las plantillas; 0 desactiva la recarga en caliente
+    TEMPLATES_RELOAD_INTERVAL_SEC: float = 5.0
+
+    # --- Persistence ---
+    PERSIST_BATCH_SIZE: int = 1000
+    # A partir de este número de movimientos se usa COPY FROM STDIN (solo PostgreSQL)
+    PERSIST_COPY_THRESHOLD: int = 5000
+
+    # --- Metrics ---
+    # Puerto del endpoint /metrics de los workers (la API lo sirve en /metrics); 0 lo desactiva
+    METRICS_PORT: int = 9100
 
     # --- Server ---
     API_PREFIX: str = ""
@@ -40,6 +113,18 @@ class Settings(BaseSettings):
             f"@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
         )
 
+    def async_database_dsn(self) -> str:
+        """Same database through an async driver (asyncpg, or aiosqlite in local tests)"""
+        if self.ASYNC_DATABASE_URL:
+            return self.ASYNC_DATABASE_URL
+        dsn = self.database_dsn()
+        scheme, sep, rest = dsn.partition("://")
+        if scheme.startswith("postgresql"):
+            return f"postgresql+asyncpg{sep}{rest}"
+        if scheme.startswith("sqlite"):
+            return f"sqlite+aiosqlite{sep}{rest}"
+        return dsn
+
 @lru_cache(maxsize=1)
 def get_settings() -> Settings:
     settings = Settings()
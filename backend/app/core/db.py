@@ -1,7 +1,8 @@
 # app/core/db.py
 from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base, Session
-from typing import Generator
+from typing import AsyncGenerator, Generator
 from contextlib import contextmanager
 from time import sleep
 import logging
@@ -16,14 +17,17 @@ Base = declarative_base()
 # --- Engine SQLAlchemy (síncrono) ---
 DB_DSN = settings.database_dsn()
 
-engine = create_engine(
-    DB_DSN,
-    future=True,
-    pool_pre_ping=True,     
-    pool_size=5,
-    max_overflow=10,
-    pool_recycle=1800,
-)
+def _create_engine(pool_size: int = settings.DB_POOL_SIZE, max_overflow: int = settings.DB_MAX_OVERFLOW):
+    return create_engine(
+        DB_DSN,
+        future=True,
+        pool_pre_ping=True,     
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_recycle=1800,
+    )
+
+engine = _create_engine()
 SessionLocal = sessionmaker(
     bind=engine,
     autoflush=False,
@@ -32,6 +36,28 @@ SessionLocal = sessionmaker(
     future=True,
 )
 
+# --- Engine async (asyncpg) para los endpoints de la API ---
+# Los workers del pipeline siguen usando el engine síncrono.
+ASYNC_DB_DSN = settings.async_database_dsn()
+
+def _create_async_engine():
+    pool_kwargs = {}
+    # aiosqlite (tests locales) no usa QueuePool
+    if not ASYNC_DB_DSN.startswith("sqlite"):
+        pool_kwargs = {
+            "pool_size": settings.ASYNC_DB_POOL_SIZE,
+            "max_overflow": settings.ASYNC_DB_MAX_OVERFLOW,
+            "pool_recycle": 1800,
+        }
+    return create_async_engine(ASYNC_DB_DSN, pool_pre_ping=True, **pool_kwargs)
+
+async_engine = _create_async_engine()
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
 def _try_connect(retries: int = 10, delay_sec: float = 1.5) -> None:
     last_exc: Exception | None = None
     for attempt in range(1, retries + 1):
@@ -48,6 +74,16 @@ def _try_connect(retries: int = 10, delay_sec: float = 1.5) -> None:
     if last_exc:
         raise last_exc
 
+def init_worker_engine() -> None:
+    """
+    Give a pool worker process its own engine.
+    Connections inherited from the parent must never be reused across processes.
+    """
+    global engine
+    engine.dispose(close=False)
+    engine = _create_engine(pool_size=settings.WORKER_DB_POOL_SIZE, max_overflow=0)
+    SessionLocal.configure(bind=engine)
+
 def init_db(run_migrations: bool = False) -> None:
     _try_connect()
     if run_migrations:
@@ -61,6 +97,10 @@ def get_db() -> Generator[Session, None, None]:
     finally:
         db.close()
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
+
 @contextmanager
 def session_scope() -> Generator[Session, None, None]:
     db = SessionLocal()
@@ -0,0 +1,170 @@
+# app/core/events.py
+"""
+Document status fan-out.
+Status changes flushed through any Session are published to an in-process
+broker after commit and, on PostgreSQL, sent with pg_notify inside the same
+transaction. API processes LISTEN on that channel so status changes made by
+workers on other nodes reach their SSE subscribers too.
+"""
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+import uuid
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session
+
+from app.models.document import Document
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "doc_status"
+# PostgreSQL rechaza payloads de 8000 bytes o más, y el NOTIFY va en la misma transacción que el estado
+NOTIFY_ERROR_MAX_BYTES = 1024
+# Identifica a este proceso para ignorar el eco de sus propios NOTIFY
+ORIGIN = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class StatusBroker:
+    """Thread-safe pub/sub of status events keyed by document id, delivered to asyncio queues"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+
+    def subscribe(self, doc_ids: Iterable[str]) -> "Subscription":
+        return Subscription(self, list(doc_ids))
+
+    def _add(self, doc_ids: List[str], entry) -> None:
+        with self._lock:
+            for doc_id in doc_ids:
+                self._subscribers.setdefault(doc_id, set()).add(entry)
+
+    def _remove(self, doc_ids: List[str], entry) -> None:
+        with self._lock:
+            for doc_id in doc_ids:
+                subs = self._subscribers.get(doc_id)
+                if subs:
+                    subs.discard(entry)
+                    if not subs:
+                        del self._subscribers[doc_id]
+
+    def publish(self, evt: dict) -> None:
+        with self._lock:
+            targets = list(self._subscribers.get(evt["doc_id"], ()))
+        for loop, queue in targets:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, evt)
+            except RuntimeError:
+                pass  # loop cerrado
+
+
+class Subscription:
+    def __init__(self, broker: StatusBroker, doc_ids: List[str]):
+        self.broker = broker
+        self.doc_ids = doc_ids
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._entry = (asyncio.get_running_loop(), self.queue)
+
+    def __enter__(self) -> "Subscription":
+        self.broker._add(self.doc_ids, self._entry)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.broker._remove(self.doc_ids, self._entry)
+
+    async def get(self, timeout: float) -> Optional[dict]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+BROKER = StatusBroker()
+
+
+def status_event(doc_id: str, status, error: Optional[str] = None) -> dict:
+    return {"doc_id": doc_id, "status": getattr(status, "value", status), "error": error}
+
+
+def _notify_payload(evt: dict) -> str:
+    """
+    pg_notify payload of an event. Long errors (tracebacks) are cut, so they can
+    never abort the transaction that records the status; /status has the full text.
+    """
+    error = evt.get("error")
+    if error:
+        encoded = error.encode("utf-8")
+        if len(encoded) > NOTIFY_ERROR_MAX_BYTES:
+            evt = {**evt, "error": encoded[:NOTIFY_ERROR_MAX_BYTES].decode("utf-8", "ignore") + "…"}
+    return json.dumps({**evt, "origin": ORIGIN}, ensure_ascii=False)
+
+
+def notify_status(db: Session, events: List[dict]) -> None:
+    """Queue status events on a session: pg_notify now (sent at commit), in-process after commit"""
+    if not events:
+        return
+    if db.get_bind().dialect.name == "postgresql":
+        conn = db.connection()
+        for evt in events:
+            conn.execute(text("SELECT pg_notify(:channel, :payload)"),
+                         {"channel": NOTIFY_CHANNEL, "payload": _notify_payload(evt)})
+    db.info.setdefault("status_events", []).extend(events)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_status_changes(session: Session, flush_context) -> None:
+    events = []
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Document):
+            added = inspect(obj).attrs.status.history.added
+            if added:
+                events.append(status_event(obj.id, added[0], obj.error))
+    notify_status(session, events)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_after_commit(session: Session) -> None:
+    for evt in session.info.pop("status_events", []):
+        BROKER.publish(evt)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_after_rollback(session: Session) -> None:
+    session.info.pop("status_events", None)
+
+
+def start_pg_listener(engine, broker: StatusBroker = BROKER) -> threading.Thread:
+    """LISTEN for status notifications from other processes/nodes and feed the broker"""
+
+    def _listen():
+        while True:
+            try:
+                raw = engine.raw_connection()
+                try:
+                    conn = raw.dbapi_connection
+                    conn.autocommit = True
+                    with conn.cursor() as cur:
+                        cur.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                    while True:
+                        if select.select([conn], [], [], 5) == ([], [], []):
+                            continue
+                        conn.poll()
+                        while conn.notifies:
+                            note = conn.notifies.pop(0)
+                            evt = json.loads(note.payload)
+                            if evt.pop("origin", None) != ORIGIN:
+                                broker.publish(evt)
+                finally:
+                    raw.invalidate()
+            except Exception as e:  # noqa: BLE001
+                logger.warning(f"Status listener disconnected, retrying: {e}")
+                threading.Event().wait(2.0)
+
+    thread = threading.Thread(target=_listen, name="status-listener", daemon=True)
+    thread.start()
+    return thread
@@ -1,3 +1,39 @@
 # app/core/executor.py
-from concurrent.futures import ThreadPoolExecutor
-EXECUTOR = ThreadPoolExecutor(max_workers=2) 
+import multiprocessing
+import sys
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Optional
+
+from app.core.config import settings
+
+
+def _init_process_worker():
+    from app.core.db import init_worker_engine
+    init_worker_engine()
+
+
+def build_executor(backend: Optional[str] = None, max_workers: Optional[int] = None) -> Executor:
+    """
+    Build the pipeline executor selected in Settings.
+    "thread" is the development default; "process" sidesteps the GIL for the
+    CPU-bound stages (pdfplumber layout analysis, regex parsing, OCR handling).
+    """
+    backend = (backend or settings.EXECUTOR_BACKEND).lower()
+    max_workers = max_workers or settings.EXECUTOR_MAX_WORKERS
+
+    if backend == "thread":
+        return ThreadPoolExecutor(max_workers=max_workers)
+
+    if backend == "process":
+        kwargs = {}
+        # max_tasks_per_child existe desde Python 3.11 y no admite "fork"
+        if settings.EXECUTOR_MAX_TASKS_PER_CHILD and sys.version_info >= (3, 11):
+            kwargs["max_tasks_per_child"] = settings.EXECUTOR_MAX_TASKS_PER_CHILD
+        return ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_process_worker,
+            **kwargs,
+        )
+
+    raise ValueError(f"Unknown EXECUTOR_BACKEND: {backend!r} (expected 'thread' or 'process')")
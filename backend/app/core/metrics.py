@@ -0,0 +1,117 @@
+# app/core/metrics.py
+"""
+Pipeline instrumentation.
+StageTimer measures wall and CPU time of a pipeline stage plus the pages,
+transactions and bytes it handled, and exports them as Prometheus metrics
+labelled by stage and bank. CPU time is the calling thread's (thread_time),
+so OCR done in the OCR process pool only shows up in wall time.
+
+With EXECUTOR_BACKEND=process or OCR_MAX_WORKERS > 1, metrics are recorded
+in child processes: set PROMETHEUS_MULTIPROC_DIR (an empty, writable dir)
+for every process so /metrics aggregates them.
+"""
+import os
+import time
+from typing import Callable, Optional, Tuple
+
+try:
+    from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter,
+                                   Histogram, generate_latest, multiprocess, start_http_server)
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+UNKNOWN_BANK = "UNKNOWN"
+
+STAGE_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+OCR_PAGE_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0)
+
+if PROMETHEUS_AVAILABLE:
+    STAGE_SECONDS = Histogram("banky_stage_duration_seconds", "Wall time of a pipeline stage",
+                              ["stage", "bank"], buckets=STAGE_BUCKETS)
+    STAGE_CPU_SECONDS = Histogram("banky_stage_cpu_seconds", "CPU time of a pipeline stage (calling thread)",
+                                  ["stage", "bank"], buckets=STAGE_BUCKETS)
+    STAGE_PAGES = Counter("banky_stage_pages", "Pages handled by a pipeline stage", ["stage", "bank"])
+    STAGE_TRANSACTIONS = Counter("banky_stage_transactions", "Transactions handled by a pipeline stage",
+                                 ["stage", "bank"])
+    STAGE_BYTES = Counter("banky_stage_bytes", "Input bytes handled by a pipeline stage", ["stage", "bank"])
+    OCR_PAGE_SECONDS = Histogram("banky_ocr_page_duration_seconds", "Render + Tesseract time of one page",
+                                 ["bank"], buckets=OCR_PAGE_BUCKETS)
+    TABLE_ERRORS = Counter("banky_table_extraction_errors", "Documents whose table extraction failed (regex fallback)",
+                           ["bank"])
+
+
+def bank_label(bank) -> str:
+    return getattr(bank, "value", bank) or UNKNOWN_BANK
+
+
+class StageTimer:
+    """
+    Context manager timing one stage. Set `bank`, `pages`, `transactions` and
+    `bytes` inside the block; they are exported on exit and passed to `on_exit`
+    (e.g. to store the timing with the document).
+    """
+
+    def __init__(self, stage: str, bank=None, on_exit: Optional[Callable[["StageTimer"], None]] = None):
+        self.stage = stage
+        self.bank = bank
+        self.on_exit = on_exit
+        self.pages: Optional[int] = None
+        self.transactions: Optional[int] = None
+        self.bytes: Optional[int] = None
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    def __enter__(self) -> "StageTimer":
+        self._wall0 = time.perf_counter()
+        self._cpu0 = time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.wall = time.perf_counter() - self._wall0
+        self.cpu = time.thread_time() - self._cpu0
+        self._export()
+        if self.on_exit is not None:
+            self.on_exit(self)
+        return False
+
+    def _export(self) -> None:
+        if not PROMETHEUS_AVAILABLE:
+            return
+        labels = (self.stage, bank_label(self.bank))
+        STAGE_SECONDS.labels(*labels).observe(self.wall)
+        STAGE_CPU_SECONDS.labels(*labels).observe(self.cpu)
+        if self.pages:
+            STAGE_PAGES.labels(*labels).inc(self.pages)
+        if self.transactions:
+            STAGE_TRANSACTIONS.labels(*labels).inc(self.transactions)
+        if self.bytes:
+            STAGE_BYTES.labels(*labels).inc(self.bytes)
+
+
+def observe_ocr_page(bank, seconds: float) -> None:
+    if PROMETHEUS_AVAILABLE:
+        OCR_PAGE_SECONDS.labels(bank_label(bank)).observe(seconds)
+
+
+def count_table_error(bank) -> None:
+    if PROMETHEUS_AVAILABLE:
+        TABLE_ERRORS.labels(bank_label(bank)).inc()
+
+
+def _registry():
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def metrics_payload() -> Tuple[bytes, str]:
+    """Body and content type for a /metrics response"""
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
+
+
+def start_metrics_server(port: int) -> None:
+    """Serve /metrics on its own port (workers have no HTTP app)"""
+    start_http_server(port, registry=_registry())
@@ -0,0 +1,137 @@
+# app/core/queue.py
+"""
+Durable job queue on the `jobs` table.
+Workers claim jobs with SELECT ... FOR UPDATE SKIP LOCKED, hold them for a
+visibility timeout that they keep extending while the job runs, and retry
+failures with exponential backoff. A job whose worker dies becomes claimable
+again once its lock expires.
+"""
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.state import set_status
+from app.models.document import DocStatus
+from app.models.job import Job, JobStatus
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def enqueue(db: Session, doc_id: str) -> Job:
+    """Add a job for a document to the session; committed by the caller together with the document"""
+    job = Job(document_id=doc_id, status=JobStatus.QUEUED, attempts=0,
+              max_attempts=settings.QUEUE_MAX_ATTEMPTS, run_after=_now())
+    db.add(job)
+    return job
+
+
+def enqueue_many(db: Session, doc_ids: List[str]) -> None:
+    """Queue many documents with a single multi-row insert; committed by the caller"""
+    if not doc_ids:
+        return
+    now = _now()
+    db.execute(insert(Job), [
+        {"id": str(uuid.uuid4()), "document_id": doc_id, "status": JobStatus.QUEUED, "attempts": 0,
+         "max_attempts": settings.QUEUE_MAX_ATTEMPTS, "run_after": now}
+        for doc_id in doc_ids
+    ])
+
+
+def claim_jobs(db: Session, worker_id: str, limit: int) -> List[Tuple[str, str]]:
+    """
+    Claim up to `limit` runnable jobs: queued ones that are due, plus running
+    ones whose visibility timeout expired. Returns (job_id, document_id) pairs.
+    """
+    now = _now()
+    stmt = (
+        select(Job)
+        .where(or_(
+            and_(Job.status == JobStatus.QUEUED, Job.run_after <= now),
+            and_(Job.status == JobStatus.RUNNING, Job.locked_until < now),
+        ))
+        .order_by(Job.run_after)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    claimed = []
+    for job in db.execute(stmt).scalars().all():
+        if job.attempts >= job.max_attempts:
+            # Se le acabó el tiempo en todos sus intentos (worker caído)
+            job.status = JobStatus.FAILED
+            job.locked_by = job.locked_until = None
+            job.last_error = job.last_error or "visibility timeout expired"
+            # El documento también queda FAILED, en la misma transacción que el job
+            set_status(db, job.document_id, DocStatus.FAILED, error=job.last_error, commit=False)
+            continue
+        job.status = JobStatus.RUNNING
+        job.attempts += 1
+        job.locked_by = worker_id
+        job.locked_until = now + timedelta(seconds=settings.QUEUE_VISIBILITY_TIMEOUT_SEC)
+        claimed.append((job.id, job.document_id))
+    db.commit()
+    return claimed
+
+
+def extend_locks(db: Session, worker_id: str, job_ids: List[str]) -> None:
+    """Heartbeat: push back the visibility timeout of jobs this worker still runs"""
+    if not job_ids:
+        return
+    db.execute(
+        update(Job)
+        .where(Job.id.in_(job_ids), Job.locked_by == worker_id, Job.status == JobStatus.RUNNING)
+        .values(locked_until=_now() + timedelta(seconds=settings.QUEUE_VISIBILITY_TIMEOUT_SEC))
+    )
+    db.commit()
+
+
+def complete_job(db: Session, job_id: str, worker_id: str) -> None:
+    db.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.locked_by == worker_id)
+        .values(status=JobStatus.DONE, locked_by=None, locked_until=None)
+    )
+    db.commit()
+
+
+def release_jobs(db: Session, job_ids: List[str], worker_id: str) -> None:
+    """Give claimed jobs that never started back to the queue, without using up an attempt"""
+    if not job_ids:
+        return
+    db.execute(
+        update(Job)
+        .where(Job.id.in_(job_ids), Job.locked_by == worker_id, Job.status == JobStatus.RUNNING)
+        .values(status=JobStatus.QUEUED, attempts=Job.attempts - 1, locked_by=None, locked_until=None,
+                run_after=_now())
+    )
+    db.commit()
+
+
+def retry_backoff(attempts: int) -> float:
+    """Seconds before the next attempt: base * 2^(attempts-1), capped"""
+    delay = settings.QUEUE_RETRY_BACKOFF_SEC * (2 ** max(attempts - 1, 0))
+    return min(delay, settings.QUEUE_RETRY_BACKOFF_MAX_SEC)
+
+
+def fail_job(db: Session, job_id: str, worker_id: str, error: str) -> bool:
+    """
+    Record a failed attempt. Requeues with backoff while attempts remain.
+    Returns True when the job is permanently failed.
+    """
+    job: Optional[Job] = db.get(Job, job_id)
+    if job is None or job.locked_by != worker_id:
+        return False
+    job.last_error = error
+    job.locked_by = job.locked_until = None
+    if job.attempts >= job.max_attempts:
+        job.status = JobStatus.FAILED
+    else:
+        job.status = JobStatus.QUEUED
+        job.run_after = _now() + timedelta(seconds=retry_backoff(job.attempts))
+    db.commit()
+    return job.status == JobStatus.FAILED
@@ -1,16 +1,131 @@
 # app/core/state.py
+"""
+Document status writes.
+Every stage transition is appended to document_stage_events and mirrored to
+documents.status with a narrow UPDATE (no ORM flush of the whole row, no
+refresh). With STAGE_JOURNAL_BATCH (the default) the intermediate transitions
+stay in the session and are written, in one statement, together with the
+terminal status; turn it off to commit every stage and resume a retried
+document from its last finished stage.
+"""
+from sqlalchemy import event, insert, update
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.orm.attributes import set_committed_value
+import app.core.events  # noqa: F401  (registra la publicación de cambios de estado)
+from app.core.config import settings
+from app.core.events import notify_status, status_event
 from app.models.document import Document, DocStatus
+from app.models.stage_event import DocumentStageEvent, DocumentStageTiming
 from datetime import datetime, timezone
-from typing import Optional
-
-def set_status(db: Session, doc_id: str, status: DocStatus, error: Optional[str] = None):
-    doc = db.get(Document, doc_id)
-    if doc is not None:
-        doc.status = status
-        doc.error = error
-        if status in (DocStatus.DONE, DocStatus.FAILED):
-            doc.processed_at = datetime.now(timezone.utc)
+from typing import Dict, Optional
+
+TERMINAL_STATUSES = (DocStatus.DONE, DocStatus.FAILED)
+
+_JOURNAL_KEY = "stage_journal"
+_TIMINGS_KEY = "stage_timings"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def record_stage(db: Session, doc_id: str, stage: DocStatus) -> None:
+    """Journal an intermediate transition: written now, or with the terminal status in batch mode"""
+    db.info.setdefault(_JOURNAL_KEY, []).append(
+        {"document_id": doc_id, "stage": stage.value, "created_at": _now()}
+    )
+    if not settings.STAGE_JOURNAL_BATCH:
+        _flush_journal(db)
+
+
+def record_timing(db: Session, doc_id: str, timer) -> None:
+    """Keep a StageTimer result; stored with the next journal write"""
+    db.info.setdefault(_TIMINGS_KEY, []).append({
+        "document_id": doc_id,
+        "stage": timer.stage,
+        "bank": getattr(timer.bank, "value", timer.bank),
+        "wall_ms": timer.wall * 1000,
+        "cpu_ms": timer.cpu * 1000,
+        "pages": timer.pages,
+        "transactions": timer.transactions,
+        "bytes": timer.bytes,
+        "created_at": _now(),
+    })
+
+
+def commit_stage(db: Session, doc_id: str, stage: DocStatus) -> None:
+    """
+    Journal a transition and commit the work of the stage (artifacts) with it.
+    In batch mode nothing is committed until the terminal status, so a crash
+    resumes from the last committed stage instead of the last finished one.
+    """
+    record_stage(db, doc_id, stage)
+    if not settings.STAGE_JOURNAL_BATCH:
         db.commit()
-    db.refresh(doc)
-    return doc
+
+
+def set_status(db: Session, doc_id: str, status: DocStatus, error: Optional[str] = None,
+               commit: bool = True) -> None:
+    """
+    Write a status synchronously, together with any batched transitions, and
+    commit (commit=False leaves it to the caller's transaction).
+    """
+    values = {"error": error}
+    if status in TERMINAL_STATUSES:
+        values["processed_at"] = _now()
+    db.info.setdefault(_JOURNAL_KEY, []).append(
+        {"document_id": doc_id, "stage": status.value, "created_at": _now()}
+    )
+    _flush_journal(db, {doc_id: values})
+    if commit:
+        db.commit()
+
+
+def flush_timings(db: Session) -> None:
+    """Insert the buffered stage timings now, e.g. for an attempt that failed and will be retried"""
+    timings = db.info.pop(_TIMINGS_KEY, [])
+    if timings:
+        db.execute(insert(DocumentStageTiming), timings)
+
+
+def _flush_journal(db: Session, final_values: Optional[Dict[str, dict]] = None) -> None:
+    flush_timings(db)
+    rows = db.info.pop(_JOURNAL_KEY, [])
+    if not rows:
+        return
+    final_values = final_values or {}
+    db.execute(insert(DocumentStageEvent), rows)
+
+    latest = {row["document_id"]: row for row in rows}
+    events = []
+    for row in rows:
+        doc_id = row["document_id"]
+        values = final_values.get(doc_id, {}) if row is latest[doc_id] else {}
+        events.append(status_event(doc_id, row["stage"], values.get("error")))
+
+    for doc_id, row in latest.items():
+        status = DocStatus(row["stage"])
+        values = final_values.get(doc_id)
+        if values is None:
+            # Transición intermedia: solo status; updated_at se conserva hasta el estado final
+            stmt = update(Document.__table__).values(status=status, updated_at=Document.__table__.c.updated_at)
+        else:
+            stmt = update(Document.__table__).values(status=status, **values)
+        db.execute(stmt.where(Document.__table__.c.id == doc_id))
+
+        # Mantener al día la instancia cargada en la sesión sin volver a leerla
+        doc = db.identity_map.get(identity_key(Document, doc_id))
+        if doc is not None:
+            set_committed_value(doc, "status", status)
+            for key, value in (values or {}).items():
+                set_committed_value(doc, key, value)
+
+    # Los UPDATE de Core no pasan por after_flush: publicar explícitamente
+    notify_status(db, events)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_journal_after_rollback(session: Session) -> None:
+    # Los tiempos se conservan: se guardan con el estado FAILED para investigar el fallo
+    session.info.pop(_JOURNAL_KEY, None)
@@ -1,19 +1,406 @@
 # app/core/storage.py
-import hashlib, os, shutil
+"""
+Content-addressed storage for uploaded statements.
+Files are stored once per SHA-256 under a sharded key (ab/cd/<sha256>.pdf);
+uploads are hashed into a staging file first and only moved into place when
+the hash is new. Backends: local filesystem and S3-compatible object stores
+(AWS S3, MinIO), the latter with a size-bounded local read-through cache.
+"""
+import hashlib, io, os, tempfile, threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterator, Optional
 from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
 
-UPLOAD_DIR = "s3"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+from app.core.config import settings
 
-def save_upload(file: UploadFile, name: str) -> tuple[str, str]:
-    path = os.path.join(UPLOAD_DIR, name)
-    with open(path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
-    return path, file.content_type or "application/octet-stream"
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+    S3_LIBS_AVAILABLE = True
+except ImportError:
+    S3_LIBS_AVAILABLE = False
+
+CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class StagedUpload:
+    """An upload written to a local staging file, hashed but not yet stored"""
+    path: str
+    sha256: str
+    size: int
+    content_type: str
+
+
+class StorageBackend:
+    """Interface for where statements live (local disk, S3-compatible stores, ...)"""
+
+    def key_for(self, digest: str, ext: str = ".pdf") -> str:
+        return f"{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+    def staging_dir(self) -> str:
+        """Local directory for in-flight uploads"""
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def put_file(self, local_path: str, key: str) -> None:
+        """Store a staged file under key, atomically. The staged file is consumed."""
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> str:
+        """Path on the local filesystem the pipeline can open"""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def size(self, key: str) -> int:
+        raise NotImplementedError
+
+    def open_stream(self, key: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Yield the object in chunks without loading it whole"""
+        raise NotImplementedError
+
+    def read_range(self, key: str, start: int, length: int) -> bytes:
+        """Read length bytes starting at offset start"""
+        raise NotImplementedError
+
+    def is_local(self, key: str) -> bool:
+        """True when local_path(key) is available without a download"""
+        return True
+
+    def open_ranged(self, key: str) -> "RangedReader":
+        """Seekable file object backed by ranged reads"""
+        return RangedReader(self, key)
+
+    def discard(self, staged: StagedUpload) -> None:
+        try:
+            os.remove(staged.path)
+        except FileNotFoundError:
+            pass
+
+
+class LocalStorage(StorageBackend):
+    """Storage on the local filesystem"""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(self.staging_dir(), exist_ok=True)
+
+    def staging_dir(self) -> str:
+        # Mismo sistema de archivos que el destino para que os.replace sea atómico
+        return os.path.join(self.root, ".staging")
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.local_path(key))
+
+    def put_file(self, local_path: str, key: str) -> None:
+        dest = self.local_path(key)
+        if os.path.exists(dest):
+            os.remove(local_path)
+            return
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        os.replace(local_path, dest)
+
+    def local_path(self, key: str) -> str:
+        # Las filas anteriores guardaban la ruta completa (s3/<filename>)
+        if os.path.isabs(key) or key.startswith(self.root + os.sep):
+            return key
+        return os.path.join(self.root, key)
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self.local_path(key))
+        except FileNotFoundError:
+            pass
+
+    def size(self, key: str) -> int:
+        return os.path.getsize(self.local_path(key))
+
+    def open_stream(self, key: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        with open(self.local_path(key), "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                yield chunk
+
+    def read_range(self, key: str, start: int, length: int) -> bytes:
+        with open(self.local_path(key), "rb") as f:
+            f.seek(start)
+            return f.read(length)
+
+
+class FileCache:
+    """Local directory of downloaded objects with size-bounded LRU eviction (mtime = last use)"""
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def get(self, key: str) -> Optional[str]:
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def add(self, tmp_path: str, key: str) -> str:
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._evict(keep=path)
+        return path
+
+    def _evict(self, keep: str) -> None:
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                continue
+
+
+class S3Storage(StorageBackend):
+    """S3-compatible object storage (AWS S3, MinIO) with a local read-through cache"""
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, region: Optional[str] = None,
+                 access_key_id: Optional[str] = None, secret_access_key: Optional[str] = None,
+                 prefix: str = "", cache: Optional[FileCache] = None, staging: Optional[str] = None):
+        if not S3_LIBS_AVAILABLE:
+            raise ImportError("S3 storage requires boto3. Install with: pip install boto3")
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+        )
+        self.cache = cache or FileCache(settings.STORAGE_CACHE_DIR, settings.STORAGE_CACHE_MAX_BYTES)
+        self._staging = staging or os.path.join(tempfile.gettempdir(), "banky-staging")
+        os.makedirs(self._staging, exist_ok=True)
+
+    def _object_key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def staging_dir(self) -> str:
+        return self._staging
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def put_file(self, local_path: str, key: str) -> None:
+        # Las llaves son direccionadas por contenido: si ya existe, es el mismo archivo
+        if not self.exists(key):
+            self.client.upload_file(local_path, self.bucket, self._object_key(key))
+        os.remove(local_path)
+
+    def is_local(self, key: str) -> bool:
+        return os.path.exists(self.cache.path_for(key))
+
+    def local_path(self, key: str) -> str:
+        """Download through the read-through cache on first use"""
+        cached = self.cache.get(key)
+        if cached:
+            return cached
+        fd, tmp = tempfile.mkstemp(dir=self._staging, suffix=".download")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in self.open_stream(key):
+                    f.write(chunk)
+            return self.cache.add(tmp, key)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+        try:
+            os.remove(self.cache.path_for(key))
+        except FileNotFoundError:
+            pass
+
+    def size(self, key: str) -> int:
+        head = self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        return head["ContentLength"]
+
+    def open_stream(self, key: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        obj = self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))
+        for chunk in obj["Body"].iter_chunks(chunk_size):
+            yield chunk
+
+    def read_range(self, key: str, start: int, length: int) -> bytes:
+        if length <= 0:
+            return b""
+        obj = self.client.get_object(
+            Bucket=self.bucket,
+            Key=self._object_key(key),
+            Range=f"bytes={start}-{start + length - 1}",
+        )
+        return obj["Body"].read()
+
+
+class RangedReader(io.RawIOBase):
+    """
+    Read-only, seekable file object over StorageBackend.read_range.
+    Fetches fixed-size blocks on demand and keeps the most recent ones, so a
+    PDF parser can read the trailer and the first pages without a full download.
+    """
+
+    def __init__(self, storage: StorageBackend, key: str, block_size: int = 256 * 1024, max_blocks: int = 64):
+        super().__init__()
+        self.storage = storage
+        self.key = key
+        self.block_size = block_size
+        self.max_blocks = max_blocks
+        self._size = storage.size(key)
+        self._pos = 0
+        self._blocks: "OrderedDict[int, bytes]" = OrderedDict()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        elif whence == io.SEEK_END:
+            self._pos = self._size + offset
+        else:
+            raise ValueError(f"invalid whence: {whence}")
+        self._pos = max(self._pos, 0)
+        return self._pos
+
+    def _block(self, index: int) -> bytes:
+        block = self._blocks.get(index)
+        if block is None:
+            block = self.storage.read_range(self.key, index * self.block_size, self.block_size)
+            self._blocks[index] = block
+            if len(self._blocks) > self.max_blocks:
+                self._blocks.popitem(last=False)
+        else:
+            self._blocks.move_to_end(index)
+        return block
+
+    def readinto(self, b) -> int:
+        view = memoryview(b).cast("B")
+        n = max(0, min(len(view), self._size - self._pos))
+        written = 0
+        while written < n:
+            index, offset = divmod(self._pos, self.block_size)
+            block = self._block(index)
+            chunk = block[offset:offset + n - written]
+            if not chunk:
+                break
+            view[written:written + len(chunk)] = chunk
+            written += len(chunk)
+            self._pos += len(chunk)
+        return written
+
+
+def build_storage() -> StorageBackend:
+    backend = settings.STORAGE_BACKEND.lower()
+    if backend == "local":
+        return LocalStorage(settings.STORAGE_LOCAL_ROOT)
+    if backend == "s3":
+        return S3Storage(
+            bucket=settings.S3_BUCKET,
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            region=settings.S3_REGION,
+            access_key_id=settings.S3_ACCESS_KEY_ID,
+            secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+            prefix=settings.S3_PREFIX,
+        )
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend!r} (expected 'local' or 's3')")
+
+
+STORAGE = build_storage()
+
+
+def _write_chunk(f, h, chunk: bytes) -> None:
+    h.update(chunk)
+    f.write(chunk)
+
+async def stage_upload(file: UploadFile, storage: StorageBackend = STORAGE) -> StagedUpload:
+    """
+    Stream an upload into a staging file in chunks, hashing while writing.
+    Disk writes and hashing run in the threadpool, so the event loop never
+    blocks and the file is never read back.
+    """
+    h = hashlib.sha256()
+    size = 0
+    fd, path = await run_in_threadpool(tempfile.mkstemp, dir=storage.staging_dir(), suffix=".upload")
+    f = os.fdopen(fd, "wb")
+    try:
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            await run_in_threadpool(_write_chunk, f, h, chunk)
+    except Exception:
+        await run_in_threadpool(f.close)
+        os.remove(path)
+        raise
+    await run_in_threadpool(f.close)
+    return StagedUpload(path, h.hexdigest(), size, file.content_type or "application/octet-stream")
+
+def stage_stream(src, content_type: str, storage: StorageBackend = STORAGE) -> StagedUpload:
+    """Synchronous counterpart of stage_upload for file objects (e.g. ZIP entries)"""
+    h = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(dir=storage.staging_dir(), suffix=".upload")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                size += len(chunk)
+                _write_chunk(f, h, chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    return StagedUpload(path, h.hexdigest(), size, content_type)
 
 def hash_file(path: str) -> str:
     h = hashlib.sha256()
     with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
             h.update(chunk)
     return h.hexdigest()
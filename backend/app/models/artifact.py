@@ -0,0 +1,14 @@
+# app/models/artifact.py
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, ForeignKey, LargeBinary, DateTime
+from datetime import datetime, timezone
+from app.database.base import Base
+
+
+class DocumentArtifact(Base):
+    """Compressed output of a pipeline stage, used to resume or partially reprocess a document"""
+    __tablename__ = "document_artifacts"
+    document_id: Mapped[str] = mapped_column(ForeignKey("documents.id", ondelete="CASCADE"), primary_key=True)
+    stage: Mapped[str] = mapped_column(String, primary_key=True)
+    payload: Mapped[bytes] = mapped_column(LargeBinary)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
@@ -1,6 +1,6 @@
 # app/models/document.py
 from sqlalchemy.orm import declarative_base, relationship, Mapped, mapped_column
-from sqlalchemy import String, Date, Text, Enum, ForeignKey, Numeric, Boolean
+from sqlalchemy import String, Date, Text, Enum, ForeignKey, Numeric, Boolean, DateTime
 from datetime import datetime, timezone
 from typing import Optional
 from app.database.base import Base
@@ -16,8 +16,8 @@ class DocStatus(str, enum.Enum):
 class Document(Base):
     __tablename__ = "documents"
     id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    created_at: Mapped[datetime] = mapped_column(default=lambda: datetime.now(timezone.utc))
-    updated_at: Mapped[datetime] = mapped_column(default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
     filename: Mapped[str] = mapped_column(String)
     content_type: Mapped[str] = mapped_column(String)
     storage_path: Mapped[str] = mapped_column(String)
@@ -28,7 +28,7 @@ class Document(Base):
     period_end: Mapped[Optional[datetime]] = mapped_column(Date, nullable=True)
     status: Mapped[DocStatus] = mapped_column(Enum(DocStatus), default=DocStatus.INGESTED)
     error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
-    processed_at: Mapped[Optional[datetime]] = mapped_column(nullable=True)
+    processed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
     file_hash: Mapped[str] = mapped_column(String, unique=True, nullable=False)
 
 
@@ -0,0 +1,27 @@
+# app/models/job.py
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, Text, Enum, ForeignKey, Integer, Index, DateTime
+from datetime import datetime, timezone
+from typing import Optional
+from app.database.base import Base
+import enum, uuid
+
+
+class JobStatus(str, enum.Enum):
+    QUEUED="QUEUED"; RUNNING="RUNNING"; DONE="DONE"; FAILED="FAILED"
+
+class Job(Base):
+    """Durable pipeline work item, claimed by workers with SELECT ... FOR UPDATE SKIP LOCKED"""
+    __tablename__ = "jobs"
+    __table_args__ = (Index("ix_jobs_status_run_after", "status", "run_after"),)
+    id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    document_id: Mapped[str] = mapped_column(ForeignKey("documents.id", ondelete="CASCADE"), index=True)
+    status: Mapped[JobStatus] = mapped_column(Enum(JobStatus), default=JobStatus.QUEUED)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    max_attempts: Mapped[int] = mapped_column(Integer, default=5)
+    run_after: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    locked_by: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    locked_until: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
@@ -0,0 +1,30 @@
+# app/models/stage_event.py
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, ForeignKey, BigInteger, Integer, Float, DateTime
+from datetime import datetime, timezone
+from typing import Optional
+from app.database.base import Base
+
+
+class DocumentStageEvent(Base):
+    """Append-only journal of the pipeline stage transitions of a document"""
+    __tablename__ = "document_stage_events"
+    id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    document_id: Mapped[str] = mapped_column(ForeignKey("documents.id", ondelete="CASCADE"), index=True)
+    stage: Mapped[str] = mapped_column(String)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+
+class DocumentStageTiming(Base):
+    """Wall/CPU time and volume of one pipeline stage run, kept to investigate slow statements"""
+    __tablename__ = "document_stage_timings"
+    id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    document_id: Mapped[str] = mapped_column(ForeignKey("documents.id", ondelete="CASCADE"), index=True)
+    stage: Mapped[str] = mapped_column(String)
+    bank: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    wall_ms: Mapped[float] = mapped_column(Float)
+    cpu_ms: Mapped[float] = mapped_column(Float)
+    pages: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    transactions: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    bytes: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
@@ -1,7 +1,7 @@
 
 import enum, uuid
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import String, Date, Text, Enum, ForeignKey, Numeric, Boolean
+from sqlalchemy import String, Date, Text, Enum, ForeignKey, Numeric, Boolean, Index
 from datetime import datetime, timezone
 from typing import Optional
 from app.database.base import Base
@@ -14,6 +14,8 @@ class TypeTransaction(str, enum.Enum):
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    # Paginación por cursor en /result: (document_id, date, id)
+    __table_args__ = (Index("ix_transactions_document_date_id", "document_id", "date", "id"),)
     id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     document_id: Mapped[str] = mapped_column(ForeignKey("documents.id", ondelete="CASCADE"), index=True)
     date: Mapped[Optional[datetime]] = mapped_column(Date, nullable=True)
@@ -0,0 +1,80 @@
+# app/pipeline/artifacts.py
+"""
+Persisted stage outputs (zlib-compressed JSON).
+run_pipeline stores the output of every stage so a crashed or reprocessed
+document resumes from the first stage whose artifact is missing instead of
+redoing classification, extraction and OCR.
+"""
+
+import json
+import zlib
+from datetime import date
+from decimal import Decimal
+from typing import Any, Dict
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from app.models.artifact import DocumentArtifact
+from app.models.bank import BankBrand
+from app.models.document import DocStatus
+
+# Etapas con artefacto, en orden de ejecución
+ARTIFACT_STAGES = [
+    DocStatus.CLASSIFIED,
+    DocStatus.TEXT_EXTRACTED,
+    DocStatus.PARSED,
+    DocStatus.NORMALIZED,
+]
+
+
+def _default(obj):
+    if isinstance(obj, date):
+        return {"__date__": obj.isoformat()}
+    if isinstance(obj, Decimal):
+        return {"__decimal__": str(obj)}
+    if isinstance(obj, BankBrand):
+        return {"__bank__": obj.value}
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _object_hook(obj):
+    if len(obj) == 1:
+        if "__date__" in obj:
+            return date.fromisoformat(obj["__date__"])
+        if "__decimal__" in obj:
+            return Decimal(obj["__decimal__"])
+        if "__bank__" in obj:
+            return BankBrand(obj["__bank__"])
+    return obj
+
+
+def encode_artifact(data: Any) -> bytes:
+    return zlib.compress(json.dumps(data, default=_default, separators=(",", ":")).encode("utf-8"))
+
+
+def decode_artifact(payload: bytes) -> Any:
+    return json.loads(zlib.decompress(payload).decode("utf-8"), object_hook=_object_hook)
+
+
+def save_artifact(db: Session, doc_id: str, stage: DocStatus, data: Any) -> None:
+    """Add/replace a stage artifact in the session; committed with the stage status"""
+    db.merge(DocumentArtifact(document_id=doc_id, stage=stage.value, payload=encode_artifact(data)))
+
+
+def load_artifacts(db: Session, doc_id: str) -> Dict[DocStatus, Any]:
+    rows = db.execute(
+        select(DocumentArtifact.stage, DocumentArtifact.payload).where(DocumentArtifact.document_id == doc_id)
+    ).all()
+    return {DocStatus(stage): decode_artifact(payload) for stage, payload in rows}
+
+
+def delete_artifacts_from(db: Session, doc_id: str, stage: DocStatus) -> None:
+    """Drop the artifact of `stage` and of every later stage"""
+    later = [s.value for s in ARTIFACT_STAGES[ARTIFACT_STAGES.index(stage):]] if stage in ARTIFACT_STAGES else []
+    if later:
+        db.execute(
+            delete(DocumentArtifact).where(
+                DocumentArtifact.document_id == doc_id, DocumentArtifact.stage.in_(later)
+            )
+        )
@@ -0,0 +1,109 @@
+# app/pipeline/cache.py
+"""
+On-disk cache of extracted page text.
+Entries are keyed by a hash of the page content (content stream or rendered
+image) plus the extractor version, so reprocessing a statement, or a page
+shared between uploads, skips pdfplumber/OCR entirely.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from typing import Iterable, Optional
+
+from app.core.config import settings
+
+# Bump when extraction or OCR output changes so stale entries stop matching
+EXTRACTOR_VERSION = "2"
+
+
+def page_cache_key(kind: str, parts: Iterable[bytes]) -> str:
+    """Hash of the extractor kind/version plus the page content parts"""
+    h = hashlib.sha256()
+    h.update(f"{kind}:{EXTRACTOR_VERSION}:".encode())
+    for part in parts:
+        h.update(part)
+    return h.hexdigest()
+
+
+class PageTextCache:
+    """Text cache on disk with size-bounded LRU eviction (file mtime = last use)"""
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.txt")
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except OSError:
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        return text
+
+    def put(self, key: str, text: str) -> None:
+        path = self._path(key)
+        data = text.encode("utf-8")
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"Page cache write failed: {e}")
+            return
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith(".txt"):
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    yield st.st_mtime, st.st_size, path
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until the cache is under 90% of its budget"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                continue
+        self._size = total
+
+
+PAGE_CACHE: Optional[PageTextCache] = (
+    PageTextCache(settings.PAGE_CACHE_DIR, settings.PAGE_CACHE_MAX_BYTES)
+    if settings.PAGE_CACHE_ENABLED else None
+)
@@ -0,0 +1,243 @@
+# app/pipeline/context.py
+"""
+Per-document processing context.
+Opens the PDF once and memoizes everything the pipeline stages read from it
+(page text, word boxes, image counts, page metadata) so a statement is parsed only once.
+"""
+
+import hashlib
+import os
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from .cache import PAGE_CACHE, page_cache_key
+
+Word = Tuple[float, float, float, float, str]
+
+try:
+    import fitz  # PyMuPDF
+    import pdfplumber
+    PDF_LIBS_AVAILABLE = True
+except ImportError:
+    PDF_LIBS_AVAILABLE = False
+
+
+class DocumentContext:
+    """Lazily opened PDF handles plus memoized per-page results"""
+
+    def __init__(self, file_path: Optional[str] = None, storage=None, key: Optional[str] = None):
+        self._file_path = file_path
+        self.storage = storage
+        self.key = key
+        self._fitz_doc = None
+        self._plumber_pdf = None
+        self._ranged = None
+        self._file_size: Optional[int] = None
+        self._plumber_text: Dict[int, str] = {}
+        self._fitz_text: Dict[int, str] = {}
+        self._image_counts: Dict[int, int] = {}
+        self._fingerprints: Dict[int, bytes] = {}
+        self._file_digest: Optional[bytes] = None
+        self._words: Dict[int, List[Word]] = {}
+        # Stage results shared between detect_*/extract/ocr helpers
+        self.pages_text: Dict[str, List[str]] = {}  # por estrategia de extracción
+        self.ocr_text: Optional[List[str]] = None
+
+    @classmethod
+    def from_storage(cls, storage, key: str) -> "DocumentContext":
+        """
+        Context over a stored object. Remote objects are not downloaded up
+        front: pdfplumber reads them through ranged reads, and the full file
+        is fetched (via the storage read-through cache) only when PyMuPDF or
+        OCR need a local path.
+        """
+        if storage.is_local(key):
+            return cls(storage.local_path(key))
+        return cls(storage=storage, key=key)
+
+    # --- Handles ---
+
+    @property
+    def file_path(self) -> str:
+        if self._file_path is None:
+            self._file_path = self.storage.local_path(self.key)
+        return self._file_path
+
+    @property
+    def is_local(self) -> bool:
+        return self._file_path is not None
+
+    @property
+    def fitz_doc(self):
+        if self._fitz_doc is None:
+            self._fitz_doc = fitz.open(self.file_path)
+        return self._fitz_doc
+
+    @property
+    def plumber_pdf(self):
+        if self._plumber_pdf is None:
+            if self.is_local:
+                self._plumber_pdf = pdfplumber.open(self.file_path)
+            else:
+                self._ranged = self.storage.open_ranged(self.key)
+                self._plumber_pdf = pdfplumber.open(self._ranged)
+        return self._plumber_pdf
+
+    @property
+    def file_size(self) -> int:
+        if self._file_size is None:
+            self._file_size = os.path.getsize(self.file_path) if self.is_local else self.storage.size(self.key)
+        return self._file_size
+
+    @property
+    def page_count(self) -> int:
+        if not self.is_local:
+            return len(self.plumber_pdf.pages)
+        return len(self.fitz_doc)
+
+    # --- Memoized page data ---
+
+    def page_fingerprint(self, page_num: int) -> bytes:
+        """Hash of what text extraction depends on: content streams (page and XObjects), fonts and geometry"""
+        if page_num not in self._fingerprints:
+            try:
+                page = self.fitz_doc.load_page(page_num)
+                h = hashlib.sha256(page.read_contents())
+                # El texto dibujado en Form XObjects (q /Fm0 Do Q) no está en el stream de la página
+                for xref, name, invoker, bbox in page.get_xobjects():
+                    h.update(repr((name, bbox)).encode())
+                    h.update(self.fitz_doc.xref_stream(xref) or b"")
+                # Sin el xref, que cambia entre archivos con el mismo contenido
+                h.update(repr([font[1:6] for font in page.get_fonts(full=True)]).encode())
+                h.update(repr((tuple(page.rect), page.rotation)).encode())
+            except Exception as e:
+                print(f"Page fingerprint from content failed, using file hash: {e}")
+                h = hashlib.sha256(self.file_digest())
+                h.update(str(page_num).encode())
+            self._fingerprints[page_num] = h.digest()
+        return self._fingerprints[page_num]
+
+    def file_digest(self) -> bytes:
+        """SHA-256 of the whole file"""
+        if self._file_digest is None:
+            h = hashlib.sha256()
+            with open(self.file_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    h.update(chunk)
+            self._file_digest = h.digest()
+        return self._file_digest
+
+    def _cached_text(self, kind: str, page_num: int, extract: Callable[[], str]) -> str:
+        """Look the page up in the on-disk page cache before running the extractor"""
+        # Sin copia local, calcular la huella obligaría a descargar el archivo completo
+        if PAGE_CACHE is None or not self.is_local:
+            return extract()
+        try:
+            key = page_cache_key(kind, [self.page_fingerprint(page_num)])
+        except Exception as e:
+            print(f"Page fingerprint failed: {e}")
+            return extract()
+        text = PAGE_CACHE.get(key)
+        if text is None:
+            text = extract()
+            PAGE_CACHE.put(key, text)
+        return text
+
+    def plumber_page_text(self, page_num: int) -> str:
+        """Text of a page as laid out by pdfplumber"""
+        if page_num not in self._plumber_text:
+            self._plumber_text[page_num] = self._cached_text(
+                f"pdfplumber-{pdfplumber.__version__}", page_num,
+                lambda: self.plumber_pdf.pages[page_num].extract_text() or "",
+            )
+        return self._plumber_text[page_num]
+
+    def fitz_page_text(self, page_num: int) -> str:
+        """Text of a page as returned by PyMuPDF"""
+        if page_num not in self._fitz_text:
+            self._fitz_text[page_num] = self._cached_text(
+                f"pymupdf-{fitz.VersionBind}", page_num,
+                lambda: self.fitz_doc.load_page(page_num).get_text() or "",
+            )
+        return self._fitz_text[page_num]
+
+    def quick_page_text(self, page_num: int) -> str:
+        """PyMuPDF text when the file is local, pdfplumber over ranged reads otherwise"""
+        if self.is_local:
+            return self.fitz_page_text(page_num)
+        return self.plumber_page_text(page_num)
+
+    def page_words(self, page_num: int) -> List[Word]:
+        """Word boxes (x0, top, x1, bottom, text) of a page, in PDF points"""
+        if page_num not in self._words:
+            if self.is_local:
+                words = [w[:5] for w in self.fitz_doc.load_page(page_num).get_text("words")]
+            else:
+                words = [(w['x0'], w['top'], w['x1'], w['bottom'], w['text'])
+                         for w in self.plumber_pdf.pages[page_num].extract_words()]
+            self._words[page_num] = words
+        return self._words[page_num]
+
+    def image_count(self, page_num: int) -> int:
+        if page_num not in self._image_counts:
+            if self.is_local:
+                count = len(self.fitz_doc.load_page(page_num).get_images())
+            else:
+                count = len(self.plumber_pdf.pages[page_num].images)
+            self._image_counts[page_num] = count
+        return self._image_counts[page_num]
+
+    def page_metadata(self, page_num: int) -> Dict:
+        """Size and rotation of a page"""
+        page = self.fitz_doc.load_page(page_num)
+        return {
+            'number': page_num,
+            'width': page.rect.width,
+            'height': page.rect.height,
+            'rotation': page.rotation,
+            'images': self.image_count(page_num),
+        }
+
+    # --- Lifecycle ---
+
+    def close(self):
+        if self._plumber_pdf is not None:
+            self._plumber_pdf.close()
+            self._plumber_pdf = None
+        if self._fitz_doc is not None:
+            self._fitz_doc.close()
+            self._fitz_doc = None
+        if self._ranged is not None:
+            self._ranged.close()
+            self._ranged = None
+
+    def __enter__(self) -> "DocumentContext":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class _borrowed:
+    """Context manager that yields an existing DocumentContext without closing it"""
+
+    def __init__(self, ctx: DocumentContext):
+        self.ctx = ctx
+
+    def __enter__(self) -> DocumentContext:
+        return self.ctx
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+PdfSource = Union[str, DocumentContext]
+
+
+def open_context(source: PdfSource):
+    """
+    Accept either a file path or an existing DocumentContext.
+    Paths get a short-lived context that is closed on exit; contexts are borrowed.
+    """
+    if isinstance(source, DocumentContext):
+        return _borrowed(source)
+    return DocumentContext(source)
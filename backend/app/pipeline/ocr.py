@@ -0,0 +1,137 @@
+# app/pipeline/ocr.py
+"""
+Page-level OCR.
+Each page is an independent task so scanned statements can be OCR'd across a
+bounded process pool instead of one page at a time.
+"""
+
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import observe_ocr_page
+from .cache import PAGE_CACHE, page_cache_key
+
+try:
+    import fitz  # PyMuPDF
+    import pytesseract
+    from PIL import Image
+    OCR_LIBS_AVAILABLE = True
+except ImportError:
+    OCR_LIBS_AVAILABLE = False
+
+OCR_LANG = 'spa+eng'
+OCR_CONFIG = '--psm 6'
+
+_POOL: Optional[ProcessPoolExecutor] = None
+_TESSERACT_VERSION: Optional[str] = None
+
+
+class OCRPageError(RuntimeError):
+    """Picklable wrapper for OCR failures raised inside pool workers"""
+
+
+def ocr_dpi_for(bank=None) -> int:
+    """Render DPI for a bank, falling back to OCR_DPI"""
+    overrides: Dict[str, int] = settings.OCR_DPI_BY_BANK
+    if bank is not None:
+        key = getattr(bank, 'value', bank)
+        if key in overrides:
+            return overrides[key]
+    return settings.OCR_DPI
+
+
+def render_page(page, dpi: int):
+    """
+    Render a page straight to a grayscale PIL image.
+    The image wraps the pixmap's sample buffer (no PNG encode/decode, no copy),
+    so the pixmap is returned too and must outlive the image.
+    """
+    zoom = dpi / 72.0
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+    img = Image.frombuffer("L", (pix.width, pix.height), pix.samples_mv, "raw", "L", pix.stride, 1)
+    return img, pix
+
+
+def _tesseract_version() -> str:
+    global _TESSERACT_VERSION
+    if _TESSERACT_VERSION is None:
+        _TESSERACT_VERSION = str(pytesseract.get_tesseract_version())
+    return _TESSERACT_VERSION
+
+
+def ocr_fitz_page(page, dpi: int, bank: Optional[str] = None) -> str:
+    """Render a PyMuPDF page and run Tesseract on it, reusing cached text for identical renders"""
+    started = time.perf_counter()
+    img, pix = render_page(page, dpi)
+
+    key = None
+    if PAGE_CACHE is not None:
+        kind = f"tesseract-{_tesseract_version()}-{OCR_LANG}-{OCR_CONFIG}-{dpi}"
+        key = page_cache_key(kind, [pix.samples_mv])
+        cached = PAGE_CACHE.get(key)
+        if cached is not None:
+            return cached
+
+    # Run OCR with Spanish language support
+    text = pytesseract.image_to_string(img, lang=OCR_LANG, config=OCR_CONFIG)
+    del img, pix
+    observe_ocr_page(bank, time.perf_counter() - started)
+    if key is not None:
+        PAGE_CACHE.put(key, text)
+    return text
+
+
+def ocr_page(file_path: str, page_num: int, dpi: int, bank: Optional[str] = None) -> str:
+    """Pool task: open the PDF in the worker and OCR a single page"""
+    try:
+        doc = fitz.open(file_path)
+        try:
+            return ocr_fitz_page(doc.load_page(page_num), dpi, bank)
+        finally:
+            doc.close()
+    except Exception as e:
+        # pytesseract exceptions cannot be unpickled in the parent, which
+        # would otherwise surface as a BrokenProcessPool
+        raise OCRPageError(f"page {page_num + 1}: {e}") from None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _POOL
+    if _POOL is None:
+        _POOL = ProcessPoolExecutor(
+            max_workers=settings.OCR_MAX_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _POOL
+
+
+def _reset_pool():
+    global _POOL
+    if _POOL is not None:
+        _POOL.shutdown(wait=False, cancel_futures=True)
+        _POOL = None
+
+
+def ocr_pages_parallel(file_path: str, page_count: int, dpi: int, bank: Optional[str] = None) -> List[str]:
+    """
+    OCR every page of a document across the OCR pool, preserving page order.
+    The first failing page cancels the pages that have not started yet and
+    its exception is re-raised.
+    """
+    pool = _get_pool()
+    futures = {pool.submit(ocr_page, file_path, page_num, dpi, bank): page_num for page_num in range(page_count)}
+    pages_text: List[str] = [""] * page_count
+    try:
+        for future in as_completed(futures):
+            pages_text[futures[future]] = future.result()
+    except Exception as e:
+        for future in futures:
+            future.cancel()
+        if isinstance(e, BrokenProcessPool):
+            _reset_pool()
+        raise
+    return pages_text
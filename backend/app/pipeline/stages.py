@@ -1,42 +1,128 @@
 # app/pipeline/stages.py
+import logging
+
+from app.core.db import SessionLocal
+from app.core.metrics import StageTimer
+from app.core.state import commit_stage, record_stage, record_timing, set_status
+from app.core.storage import STORAGE
 from app.models.document import DocStatus, Document
+from app.models.transaction import Transaction
+from sqlalchemy import delete
 from sqlalchemy.orm import Session
 
+from .artifacts import ARTIFACT_STAGES, load_artifacts, save_artifact
+from .context import DocumentContext
+from .templates import get_bank_template
 from .utils import detect_bank, detect_period, is_scanned_pdf, extract_text_pages, \
                    maybe_ocr, parse_with_template, normalize_transactions, validate_report, \
-                   persist_transactions
+                   persist_transactions, text_needs_layout
+
+logger = logging.getLogger(__name__)
+
+def process_document(doc_id: str):
+    """
+    Run the whole pipeline for one document outside the job queue (scripts,
+    benchmarks). Lives at module level so process pools can pickle it.
+    """
+    db = SessionLocal()
+    try:
+        doc = db.get(Document, doc_id)
+        run_pipeline(db, doc)
+        if doc.status != DocStatus.FAILED:
+            set_status(db, doc_id, DocStatus.DONE)
+    except Exception as e:
+        db.rollback()
+        set_status(db, doc_id, DocStatus.FAILED, error=str(e))
+    finally:
+        db.close()
 
 def run_pipeline(db: Session, doc: Document):
+    """Run the stages; the caller commits the transactions together with the DONE status"""
+    # El PDF se abre una sola vez y se comparte entre todas las etapas
+    with DocumentContext.from_storage(STORAGE, doc.storage_path) as ctx:
+        _run_stages(db, doc, ctx)
+
+def _timer(db: Session, doc: Document, stage: str, bank=None) -> StageTimer:
+    """Stage timer exported to /metrics and stored with the document"""
+    def done(t: StageTimer):
+        record_timing(db, doc.id, t)
+        logger.debug(f"{doc.id} {stage}: {t.wall * 1000:.0f} ms wall, {t.cpu * 1000:.0f} ms cpu, "
+                     f"pages={t.pages} txs={t.transactions} bytes={t.bytes}")
+    return StageTimer(stage, bank if bank is not None else doc.bank_type, on_exit=done)
+
+def _run_stages(db: Session, doc: Document, ctx: DocumentContext):
+    # Se reanuda desde la primera etapa sin artefacto; las siguientes se recalculan
+    artifacts = load_artifacts(db, doc.id)
+    resume = next((i for i, stage in enumerate(ARTIFACT_STAGES) if stage not in artifacts), len(ARTIFACT_STAGES))
+
+    def reuse(stage: DocStatus) -> bool:
+        return ARTIFACT_STAGES.index(stage) < resume
+
     # 1) CLASSIFY
-    bank = detect_bank(doc.storage_path)
-    scanned = is_scanned_pdf(doc.storage_path)
-    (pstart, pend) = detect_period(doc.storage_path)
-    doc.bank_code, doc.is_scanned, doc.period_start, doc.period_end = bank, scanned, pstart, pend
-    doc.status = DocStatus.CLASSIFIED; db.commit()
+    if reuse(DocStatus.CLASSIFIED):
+        classified = artifacts[DocStatus.CLASSIFIED]
+        bank, scanned = classified['bank'], classified['scanned']
+        pstart, pend = classified['period_start'], classified['period_end']
+    else:
+        with _timer(db, doc, "classify") as t:
+            bank = detect_bank(ctx)
+            scanned = is_scanned_pdf(ctx)
+            (pstart, pend) = detect_period(ctx)
+            t.bank, t.pages, t.bytes = bank, ctx.page_count, ctx.file_size
+        doc.bank_type, doc.bank_code = bank, bank.value
+        doc.is_scanned, doc.period_start, doc.period_end = scanned, pstart, pend
+        save_artifact(db, doc.id, DocStatus.CLASSIFIED,
+                      {'bank': bank, 'scanned': scanned, 'period_start': pstart, 'period_end': pend})
+        commit_stage(db, doc.id, DocStatus.CLASSIFIED)
 
     # 2) TEXT_EXTRACT
-    pages_text = extract_text_pages(doc.storage_path)
-    if not pages_text or scanned:
-        pages_text = maybe_ocr(doc.storage_path)  # si no hay texto o es escaneado
-    doc.status = DocStatus.TEXT_EXTRACTED; db.commit()
+    if reuse(DocStatus.TEXT_EXTRACTED):
+        pages_text = artifacts[DocStatus.TEXT_EXTRACTED]
+    else:
+        with _timer(db, doc, "extract", bank) as t:
+            pages_text = extract_text_pages(ctx, needs_layout=text_needs_layout(get_bank_template(bank)))
+            t.pages, t.bytes = len(pages_text), ctx.file_size
+        if not pages_text or scanned:
+            with _timer(db, doc, "ocr", bank) as t:
+                pages_text = maybe_ocr(ctx, bank)  # si no hay texto o es escaneado
+                t.pages, t.bytes = len(pages_text), ctx.file_size
+        save_artifact(db, doc.id, DocStatus.TEXT_EXTRACTED, pages_text)
+        commit_stage(db, doc.id, DocStatus.TEXT_EXTRACTED)
 
     # 3) PARSED
-    raw_txs, meta = parse_with_template(bank, pages_text, doc.storage_path)
-    doc.status = DocStatus.PARSED; db.commit()
+    if reuse(DocStatus.PARSED):
+        raw_txs = artifacts[DocStatus.PARSED]['transactions']
+    else:
+        with _timer(db, doc, "parse", bank) as t:
+            raw_txs, meta = parse_with_template(bank, pages_text, ctx)
+            t.pages, t.transactions = len(pages_text), len(raw_txs)
+            t.bytes = sum(len(text.encode("utf-8")) for text in pages_text)
+        save_artifact(db, doc.id, DocStatus.PARSED, {'transactions': raw_txs, 'meta': meta})
+        commit_stage(db, doc.id, DocStatus.PARSED)
 
     # 4) NORMALIZED
-    norm_txs = normalize_transactions(raw_txs)
-    doc.status = DocStatus.NORMALIZED; db.commit()
+    if reuse(DocStatus.NORMALIZED):
+        norm_txs = artifacts[DocStatus.NORMALIZED]
+    else:
+        with _timer(db, doc, "normalize", bank) as t:
+            norm_txs = normalize_transactions(raw_txs)
+            t.transactions = len(norm_txs)
+        save_artifact(db, doc.id, DocStatus.NORMALIZED, norm_txs)
+        commit_stage(db, doc.id, DocStatus.NORMALIZED)
 
     # 5) VALIDATED
-    ok, report = validate_report(norm_txs, pstart, pend)
+    with _timer(db, doc, "validate", bank) as t:
+        ok, report = validate_report(norm_txs, pstart, pend)
+        t.transactions = len(norm_txs)
     if not ok:
-        doc.status = DocStatus.FAILED
-        doc.error = report
-        db.commit()
+        set_status(db, doc.id, DocStatus.FAILED, error=report)
         return
 
-    # 6) DONE → persistir
-    persist_transactions(db, doc.id, norm_txs)
-    doc.status = DocStatus.VALIDATED
-    db.commit()
+    # 6) DONE → persistir (un reproceso reemplaza los movimientos anteriores)
+    with _timer(db, doc, "persist", bank) as t:
+        db.execute(delete(Transaction).where(Transaction.document_id == doc.id))
+        persist_transactions(db, doc.id, norm_txs)
+        t.transactions = len(norm_txs)
+    # Sin commit: los movimientos se confirman en la misma transacción que DONE (set_status del llamador),
+    # así un documento con movimientos guardados nunca queda en VALIDATED
+    record_stage(db, doc.id, DocStatus.VALIDATED)
@@ -0,0 +1,206 @@
+# app/pipeline/tables.py
+"""
+Column-aware table extraction from word coordinates.
+Instead of regexes over flattened page text, the words of a page (with
+their boxes, from PyMuPDF or pdfplumber in one pass) are grouped into rows
+by their vertical position and into columns with an x-coordinate occupancy
+histogram: columns are the x ranges covered by the words of transaction
+rows, separated by empty gaps. Templates name the columns by the header
+words that label them (FECHA, CARGOS, ABONOS, ...), so a debit and a credit
+are told apart by where the amount sits, not by guessing from the text.
+"""
+
+import unicodedata
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from .context import DocumentContext, Word
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+COLUMN_NAMES = ("date", "description", "amount", "debit", "credit", "balance", "dc")
+
+MIN_COLUMN_GAP = 4.0      # puntos sin palabras que separan dos columnas (un espacio mide ~2pt)
+ROW_TOLERANCE = 0.5       # fracción de la altura de palabra para considerar dos palabras en la misma fila
+MIN_HEADER_HITS = 2       # palabras de encabezado que debe tener una fila para tomarla como encabezado
+
+
+class Column(NamedTuple):
+    """A table column of a template: its field name and the header words that label it"""
+    name: str
+    headers: Tuple[str, ...]
+
+
+class Table(NamedTuple):
+    """Transaction rows of one page: cells[i, j] is the text of row i in column columns[j]"""
+    page: int
+    columns: Tuple[str, ...]
+    cells: "np.ndarray"
+
+
+def normalize_header(text: str) -> str:
+    """Header word as templates declare it: upper case, no accents or trailing punctuation"""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return text.strip(".:;,()").upper()
+
+
+def _rows(top: "np.ndarray", bottom: "np.ndarray", x0: "np.ndarray") -> Tuple["np.ndarray", List["np.ndarray"]]:
+    """Word indices per row, top to bottom and left to right, plus each word's row id"""
+    center = (top + bottom) / 2
+    tolerance = ROW_TOLERANCE * float(np.median(bottom - top))
+    by_y = np.argsort(center, kind="stable")
+    row_sorted = np.concatenate(([0], np.cumsum(np.diff(center[by_y]) > tolerance)))
+    row_of = np.empty(len(center), dtype=np.intp)
+    row_of[by_y] = row_sorted
+    order = np.lexsort((x0, row_of))
+    breaks = np.flatnonzero(np.diff(row_of[order])) + 1
+    return row_of, np.split(order, breaks)
+
+
+def column_spans(x0: "np.ndarray", x1: "np.ndarray", min_gap: float = MIN_COLUMN_GAP) -> "np.ndarray":
+    """
+    (start, end) of each column: the x ranges covered by at least one word,
+    after closing gaps narrower than min_gap (spaces between words).
+    """
+    origin = np.floor(x0.min())
+    width = int(np.ceil(x1.max() - origin)) + 1
+    # Histograma de ocupación por punto: +1 donde empieza cada palabra, -1 donde termina
+    delta = np.zeros(width + 1, dtype=np.int32)
+    np.add.at(delta, np.floor(x0 - origin).astype(np.intp), 1)
+    np.add.at(delta, np.ceil(x1 - origin).astype(np.intp), -1)
+    occupied = np.cumsum(delta[:-1]) > 0
+
+    edges = np.diff(np.concatenate(([0], occupied.astype(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    keep = np.concatenate(([True], starts[1:] - ends[:-1] >= min_gap))
+    starts, ends = starts[keep], np.append(ends[np.flatnonzero(keep)[1:] - 1], ends[-1])
+    return np.stack((starts + origin, ends + origin), axis=1)
+
+
+def _header_spans(rows: List["np.ndarray"], texts: List[str], x0: "np.ndarray", x1: "np.ndarray",
+                  columns: Sequence[Column]) -> Dict[str, Tuple[float, float]]:
+    """x range of each column's header word, from the row that names the most columns"""
+    best: Dict[str, Tuple[float, float]] = {}
+    for row in rows:
+        spans = {}
+        for i in row:
+            word = normalize_header(texts[i])
+            for column in columns:
+                if column.name not in spans and word in column.headers:
+                    spans[column.name] = (float(x0[i]), float(x1[i]))
+                    break
+        if len(spans) >= MIN_HEADER_HITS and len(spans) > len(best):
+            best = spans
+    return best
+
+
+def _assign_columns(spans: "np.ndarray", headers: Dict[str, Tuple[float, float]],
+                    columns: Sequence[Column], min_gap: float) -> Dict[int, str]:
+    """Column span index -> column name, by the header that overlaps the span the most"""
+    assigned: Dict[int, str] = {}
+    for column in columns:
+        if column.name not in headers:
+            continue
+        hx0, hx1 = headers[column.name]
+        overlap = np.minimum(spans[:, 1] + min_gap, hx1) - np.maximum(spans[:, 0] - min_gap, hx0)
+        best = int(np.argmax(overlap))
+        if overlap[best] > 0 and best not in assigned:
+            assigned[best] = column.name
+    return assigned
+
+
+def page_table(words: List[Word], columns: Sequence[Column], is_row_start: Callable[[List[str]], bool],
+               page: int = 0, headers: Optional[Dict[str, Tuple[float, float]]] = None,
+               min_gap: float = MIN_COLUMN_GAP) -> Tuple[Optional[Table], Dict[str, Tuple[float, float]]]:
+    """
+    Table of one page, or None when it has no transaction rows or no header
+    to name the columns. Returns the header positions too, so pages that do
+    not repeat the header can reuse the previous page's.
+    """
+    if not words:
+        return None, headers or {}
+    x0 = np.array([w[0] for w in words], dtype=np.float64)
+    top = np.array([w[1] for w in words], dtype=np.float64)
+    x1 = np.array([w[2] for w in words], dtype=np.float64)
+    bottom = np.array([w[3] for w in words], dtype=np.float64)
+    texts = [w[4] for w in words]
+
+    row_of, rows = _rows(top, bottom, x0)
+    starts = [i for i, row in enumerate(rows) if is_row_start([texts[i] for i in row])]
+    if not starts:
+        return None, headers or {}
+
+    page_headers = _header_spans(rows[:starts[0]], texts, x0, x1, columns)
+    if page_headers:
+        headers = page_headers
+    if not headers:
+        return None, {}
+
+    # Columnas a partir de las filas de movimientos únicamente (el encabezado del estado de cuenta ocupa todo el ancho)
+    in_rows = np.isin(row_of, [row_of[rows[i][0]] for i in starts])
+    spans = column_spans(x0[in_rows], x1[in_rows], min_gap)
+    names = _assign_columns(spans, headers, columns, min_gap)
+    if not names:
+        return None, headers
+
+    # Cada palabra va a la columna cuyo rango contiene su centro (o a la más cercana)
+    boundaries = (spans[:-1, 1] + spans[1:, 0]) / 2
+    column_of = np.searchsorted(boundaries, (x0 + x1) / 2)
+    names_order = tuple(c.name for c in columns if c.name in names.values())
+    index = {name: j for j, name in enumerate(names_order)}
+    has_description = "description" in names.values()
+    # Rangos de las demás columnas con nombre: una línea de continuación no puede tocarlos
+    others = spans[[s for s, name in names.items() if name != "description"]]
+    line_height = float(np.median(bottom - top))
+
+    table_rows: List[Dict[str, List[str]]] = []
+    start_set = set(starts)
+    last_bottom = None
+    for r, row in enumerate(rows):
+        if r in start_set:
+            cells: Dict[str, List[str]] = {}
+            for i in row:
+                name = names.get(int(column_of[i]))
+                if name is not None:
+                    cells.setdefault(name, []).append(texts[i])
+            table_rows.append(cells)
+            last_bottom = float(bottom[row].max())
+            continue
+        # Descripción partida en varias líneas: fila pegada a la anterior que no toca ninguna otra columna
+        if has_description and last_bottom is not None \
+                and float(top[row].min()) - last_bottom < line_height \
+                and not np.any((x0[row, None] < others[:, 1] + min_gap) & (x1[row, None] > others[:, 0] - min_gap)):
+            table_rows[-1].setdefault("description", []).extend(texts[i] for i in row)
+            last_bottom = float(bottom[row].max())
+        else:
+            last_bottom = None
+
+    cells_array = np.full((len(table_rows), len(names_order)), "", dtype=object)
+    for i, cells in enumerate(table_rows):
+        for name, parts in cells.items():
+            cells_array[i, index[name]] = " ".join(parts)
+    return Table(page, names_order, cells_array), headers
+
+
+def extract_tables(ctx: DocumentContext, columns: Sequence[Column], is_row_start: Callable[[List[str]], bool],
+                   min_gap: float = MIN_COLUMN_GAP, max_pages: Optional[int] = None) -> List[Table]:
+    """
+    Transaction tables of the first `max_pages` pages (all by default) that
+    have them. `is_row_start` decides from the words of a row, left to
+    right, whether it starts a transaction (usually "does it begin with a
+    date"). Empty without NumPy or for image-only pages.
+    """
+    if not NUMPY_AVAILABLE or not columns:
+        return []
+    tables = []
+    headers: Dict[str, Tuple[float, float]] = {}
+    page_count = ctx.page_count if max_pages is None else min(max_pages, ctx.page_count)
+    for page_num in range(page_count):
+        table, headers = page_table(ctx.page_words(page_num), columns, is_row_start, page_num, headers, min_gap)
+        if table is not None and len(table.cells):
+            tables.append(table)
+    return tables
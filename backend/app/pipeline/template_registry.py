@@ -0,0 +1,271 @@
+# app/pipeline/template_registry.py
+"""
+Declarative bank templates and the shared template registry.
+A template file (JSON, or YAML when PyYAML is installed) describes a bank's
+transaction lines with regexes using named groups, the date formats and the
+debit/credit rules. Files are compiled once into DeclarativeTemplate
+objects; the registry hands out one instance per bank and reloads the
+directory when a file changes, so a bank can be added or fixed without a
+redeploy. A file for a bank that also has a Python template takes precedence.
+
+    {
+      "bank": "HSBC",
+      "needs_layout": true,
+      "mode": "line",
+      "flags": ["IGNORECASE"],
+      "date_formats": ["%d/%m/%Y"],
+      "currency": "MXN",
+      "patterns": [
+        {"regex": "(?P<date>...)\\s+(?P<description>.+?)\\s+(?P<amount>...)", "required": "/."}
+      ],
+      "type_rules": {"indicator": {"C": "credit", "D": "debit"}, "signed_amount": false,
+                     "credit_keywords": ["DEPOSITO"], "debit_keywords": [], "default": "debit"},
+      "columns": {"date": ["FECHA"], "description": ["CONCEPTO"], "debit": ["RETIROS"],
+                  "credit": ["DEPOSITOS"], "balance": ["SALDO"]}
+    }
+
+Groups: date and description are required, plus amount or debit/credit;
+balance and dc (debit/credit indicator) are optional. mode "line" matches
+line by line; "page" runs findall over whole pages for regexes that span
+line breaks. The optional "columns" maps the same field names to the header
+words of the transaction table, which is then read by word position
+(tables.py) and the regexes only cover pages without such a table.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.models.bank import BankBrand
+from .tables import COLUMN_NAMES, Column, normalize_header
+from .templates import TEMPLATE_CLASSES, BankTemplate, PatternSet
+
+try:
+    import yaml
+    YAML_AVAILABLE = True
+except ImportError:
+    YAML_AVAILABLE = False
+
+DEFAULT_TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "bank_templates")
+TEMPLATE_EXTENSIONS = (".json", ".yaml", ".yml")
+
+TX_TYPES = ("debit", "credit", "unknown")
+
+
+class TemplateSpecError(ValueError):
+    """Invalid declarative template"""
+
+
+class DeclarativeTemplate(BankTemplate):
+    """Template compiled from a JSON/YAML definition"""
+
+    def __init__(self, spec: Dict, source: str = "<spec>"):
+        self.source = source
+        try:
+            self.bank = BankBrand(spec["bank"])
+            patterns = spec["patterns"]
+        except (KeyError, ValueError) as e:
+            raise TemplateSpecError(f"{source}: missing or invalid 'bank'/'patterns': {e}") from None
+        if not patterns:
+            raise TemplateSpecError(f"{source}: 'patterns' is empty")
+
+        self.needs_layout = bool(spec.get("needs_layout", False))
+        self.mode = spec.get("mode", "line")
+        if self.mode not in ("line", "page"):
+            raise TemplateSpecError(f"{source}: mode must be 'line' or 'page'")
+        if spec.get("date_formats"):
+            self.date_formats = tuple(spec["date_formats"])
+        self.currency = spec.get("currency", "MXN")
+
+        flags = 0
+        for name in spec.get("flags", []):
+            try:
+                flags |= getattr(re, name.upper())
+            except AttributeError:
+                raise TemplateSpecError(f"{source}: unknown regex flag {name!r}") from None
+        try:
+            self.pattern_set = PatternSet([p["regex"] for p in patterns], flags,
+                                          [p.get("required", "") for p in patterns])
+        except re.error as e:
+            raise TemplateSpecError(f"{source}: invalid regex: {e}") from None
+
+        # Posición (base 0) de cada grupo con nombre en la tupla de grupos de cada alternativa
+        self._fields: List[Dict[str, int]] = []
+        for i, compiled in enumerate(self.pattern_set.compiled):
+            fields = {name: index - 1 for name, index in compiled.groupindex.items()}
+            if "date" not in fields or "description" not in fields or \
+                    not ({"amount", "debit", "credit"} & set(fields)):
+                raise TemplateSpecError(
+                    f"{source}: pattern {i} needs (?P<date>), (?P<description>) and (?P<amount>) or (?P<debit>)/(?P<credit>)"
+                )
+            self._fields.append(fields)
+
+        columns = spec.get("columns") or {}
+        unknown = set(columns) - set(COLUMN_NAMES)
+        if unknown:
+            raise TemplateSpecError(f"{source}: unknown columns {sorted(unknown)}")
+        if columns and ("date" not in columns or "description" not in columns or
+                        not ({"amount", "debit", "credit"} & set(columns))):
+            raise TemplateSpecError(f"{source}: columns need date, description and amount or debit/credit")
+        self.columns = tuple(Column(name, tuple(normalize_header(h) for h in headers))
+                             for name, headers in columns.items())
+
+        rules = spec.get("type_rules", {})
+        self.indicator = {k.upper(): v for k, v in rules.get("indicator", {}).items()}
+        self.signed_amount = bool(rules.get("signed_amount", False))
+        self.credit_keywords = self._keywords(rules.get("credit_keywords", []))
+        self.debit_keywords = self._keywords(rules.get("debit_keywords", []))
+        self.default_type = rules.get("default", "unknown")
+        for tx_type in list(self.indicator.values()) + [self.default_type]:
+            if tx_type not in TX_TYPES:
+                raise TemplateSpecError(f"{source}: unknown transaction type {tx_type!r}")
+
+    @staticmethod
+    def _keywords(words: List[str]) -> Optional["re.Pattern"]:
+        if not words:
+            return None
+        return re.compile("|".join(re.escape(w) for w in words), re.IGNORECASE)
+
+    def parse_transactions(self, pages_text: List[str]) -> List[Dict]:
+        transactions = []
+        for page_text in pages_text:
+            if self.mode == "line":
+                for line in page_text.split('\n'):
+                    for i, groups in self.pattern_set.search_line(line):
+                        tx = self._build_transaction(i, groups)
+                        if tx:
+                            transactions.append(tx)
+            else:
+                for i, matches in self.pattern_set.findall_page(page_text):
+                    for groups in matches:
+                        tx = self._build_transaction(i, groups if isinstance(groups, tuple) else (groups,))
+                        if tx:
+                            transactions.append(tx)
+        return transactions
+
+    def _build_transaction(self, alternative: int, groups: Tuple) -> Optional[Dict]:
+        fields = self._fields[alternative]
+        return self._transaction_from_fields({name: groups[index] for name, index in fields.items()})
+
+    def _transaction_from_fields(self, fields: Dict[str, Optional[str]]) -> Optional[Dict]:
+        def field(name: str) -> Optional[str]:
+            value = fields.get(name)
+            return value.strip() if value else None
+
+        tx_date = self._parse_date(field("date") or "")
+        description = field("description")
+        if not tx_date or not description:
+            return None
+
+        debit, credit, amount = field("debit"), field("credit"), field("amount")
+        tx_type = None
+        if debit:
+            amount, tx_type = debit, "debit"
+        elif credit:
+            amount, tx_type = credit, "credit"
+        if not amount:
+            return None
+        value = self._parse_amount(amount)
+
+        if tx_type is None and field("dc"):
+            tx_type = self.indicator.get(field("dc").upper())
+        if tx_type is None and self.signed_amount and value:
+            tx_type = "debit" if value < 0 else "credit"
+        if tx_type is None and self.credit_keywords is not None and self.credit_keywords.search(description):
+            tx_type = "credit"
+        if tx_type is None and self.debit_keywords is not None and self.debit_keywords.search(description):
+            tx_type = "debit"
+
+        tx = {
+            'date': tx_date,
+            'description': description,
+            'amount': abs(value),
+            'type': tx_type or self.default_type,
+            'currency': self.currency,
+        }
+        if field("balance"):
+            tx['balance'] = self._parse_amount(field("balance"))
+        return tx
+
+
+def load_template_file(path: str) -> DeclarativeTemplate:
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".json"):
+            spec = json.load(f)
+        elif YAML_AVAILABLE:
+            spec = yaml.safe_load(f)
+        else:
+            raise TemplateSpecError(f"{path}: PyYAML is not installed")
+    if not isinstance(spec, dict):
+        raise TemplateSpecError(f"{path}: expected an object")
+    return DeclarativeTemplate(spec, source=path)
+
+
+class TemplateRegistry:
+    """One shared template per bank: Python templates plus declarative files, reloaded when they change"""
+
+    def __init__(self, directory: str, reload_interval: float):
+        self.directory = directory
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._builtin: Dict[BankBrand, BankTemplate] = {bank: cls() for bank, cls in TEMPLATE_CLASSES.items()}
+        self._fallback = BankTemplate()
+        self._templates: Dict[BankBrand, BankTemplate] = dict(self._builtin)
+        self._loaded: Dict[str, Tuple[int, Optional[DeclarativeTemplate]]] = {}  # path -> (mtime_ns, plantilla)
+        self._checked_at: Optional[float] = None
+
+    def get(self, bank: BankBrand) -> BankTemplate:
+        if self._checked_at is None or (
+            self.reload_interval > 0 and time.monotonic() - self._checked_at >= self.reload_interval
+        ):
+            self.refresh()
+        return self._templates.get(bank, self._fallback)
+
+    def _scan(self) -> Dict[str, int]:
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return {}
+        files = {}
+        for name in sorted(names):
+            if name.endswith(TEMPLATE_EXTENSIONS):
+                path = os.path.join(self.directory, name)
+                try:
+                    files[path] = os.stat(path).st_mtime_ns
+                except FileNotFoundError:
+                    continue
+        return files
+
+    def refresh(self) -> None:
+        """Recompile the files that changed since the last scan"""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            files = self._scan()
+            if files == {path: mtime for path, (mtime, _) in self._loaded.items()}:
+                return
+            loaded = {}
+            for path, mtime in files.items():
+                previous = self._loaded.get(path)
+                if previous is not None and previous[0] == mtime:
+                    loaded[path] = previous
+                    continue
+                try:
+                    loaded[path] = (mtime, load_template_file(path))
+                except (OSError, ValueError) as e:
+                    # Una plantilla rota no tumba las demás: se conserva la versión anterior
+                    print(f"Error loading bank template: {e}")
+                    loaded[path] = (mtime, previous[1] if previous else None)
+
+            templates: Dict[BankBrand, BankTemplate] = dict(self._builtin)
+            for _, template in loaded.values():
+                if template is not None:
+                    templates[template.bank] = template
+            self._loaded = loaded
+            self._templates = templates
+
+
+TEMPLATES = TemplateRegistry(settings.TEMPLATES_DIR or DEFAULT_TEMPLATES_DIR, settings.TEMPLATES_RELOAD_INTERVAL_SEC)
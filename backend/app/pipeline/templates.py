@@ -5,16 +5,120 @@ Each bank has different PDF formats and requires custom parsing.
 """
 
 import re
-from datetime import datetime, date
+from datetime import date
 from decimal import Decimal
-from typing import List, Dict, Tuple, Optional
+from typing import Iterator, List, Dict, Sequence, Tuple, Optional
 from app.models.bank import BankBrand
+from .parsers import DEFAULT_DATE_FORMATS, date_words, parse_amount, parse_date
+from .tables import Column, Table
+
+# === Template engine ===
+
+_NAMED_GROUP = re.compile(r'(?<!\\)\(\?P<\w+>')
+
+class PatternSet:
+    """
+    A template's regex alternatives, compiled once.
+    Besides the individual patterns it keeps one combined alternation and,
+    per alternative, the literal characters a match needs, so most lines are
+    rejected with a few `in` checks before any regex runs.
+    """
+    
+    def __init__(self, patterns: Sequence[str], flags: int = 0, required: Sequence[str] = ()):
+        self.compiled = [re.compile(p, flags) for p in patterns]
+        self.required = list(required) or [""] * len(patterns)
+        # Los nombres de grupo se quitan (la numeración no cambia) para que no choquen entre alternativas
+        try:
+            self.combined = re.compile(
+                "|".join(f"(?P<_{i}>{_NAMED_GROUP.sub('(', p)})" for i, p in enumerate(patterns)), flags
+            )
+        except re.error:
+            self.combined = None  # p.ej. referencias (?P=name): se busca patrón por patrón
+        # Rango de grupos de cada alternativa dentro del patrón combinado
+        self._slices = []
+        start = 1
+        for pattern in self.compiled:
+            self._slices.append(slice(start, start + pattern.groups))
+            start += pattern.groups + 1
+    
+    def _candidates(self, text: str) -> List[int]:
+        candidates = []
+        for i, req in enumerate(self.required):
+            for c in req:
+                if c not in text:
+                    break
+            else:
+                candidates.append(i)
+        return candidates
+    
+    def search_line(self, line: str) -> Iterator[Tuple[int, tuple]]:
+        """
+        (alternative, groups) for every pattern that matches the line, in
+        pattern order: the same results as calling search() with each pattern.
+        """
+        candidates = self._candidates(line)
+        if not candidates:
+            return
+        if len(candidates) == 1:
+            match = self.compiled[candidates[0]].search(line)
+            if match:
+                yield candidates[0], match.groups()
+            return
+        
+        if self.combined is None:
+            for i in candidates:
+                match = self.compiled[i].search(line)
+                if match:
+                    yield i, match.groups()
+            return
+        
+        # Una sola pasada con la alternancia; el resto solo se busca después de la posición encontrada
+        match = self.combined.search(line)
+        if match is None:
+            return
+        hit, pos = int(match.lastgroup[1:]), match.start()
+        groups = match.groups()
+        for i in candidates:
+            if i == hit:
+                yield i, groups[self._slices[i]]
+                continue
+            # Las alternativas anteriores ya fallaron en `pos`; las posteriores no pueden empezar antes
+            other = self.compiled[i].search(line, pos + 1 if i < hit else pos)
+            if other:
+                yield i, other.groups()
+    
+    def findall_page(self, text: str) -> Iterator[Tuple[int, list]]:
+        """(alternative, findall results) per pattern over a whole page, for patterns that span lines"""
+        for i in self._candidates(text):
+            yield i, self.compiled[i].findall(text)
 
 # === Mexican Bank Statement Parsing Templates ===
 
 class BankTemplate:
     """Base class for bank-specific parsing templates"""
     
+    # True when the parser relies on column-accurate text (pdfplumber layout)
+    needs_layout = False
+    
+    # Regex alternatives of the template, compiled once per class into `pattern_set`
+    patterns: Tuple[str, ...] = ()
+    pattern_flags = 0
+    # Per alternative, literal characters any match must contain (cheap line prefilter)
+    pattern_required: Tuple[str, ...] = ()
+    pattern_set = PatternSet(())
+    
+    # Formats tried in order by _parse_date (month names may be Spanish or English)
+    date_formats: Tuple[str, ...] = DEFAULT_DATE_FORMATS
+    
+    # Table columns by header word (see tables.py). When set, pages with a
+    # transaction table are read by column and the regexes only cover the rest
+    columns: Tuple[Column, ...] = ()
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if "patterns" in cls.__dict__:
+            cls.pattern_set = PatternSet(cls.patterns, cls.pattern_flags, cls.pattern_required)
+    
     def parse_transactions(self, pages_text: List[str]) -> List[Dict]:
         """Override this method in bank-specific subclasses"""
         raise NotImplementedError
@@ -23,82 +127,95 @@ class BankTemplate:
         """Extract account information like account number, client name, etc."""
         return {}
     
-    def _parse_date(self, date_str: str) -> Optional[date]:
-        """Parse various date formats used by Mexican banks"""
-        date_formats = [
-            '%d/%m/%Y',
-            '%d-%m-%Y', 
-            '%d-%b-%Y',
-            '%Y-%m-%d'
-        ]
-        
-        # Handle Spanish month abbreviations
-        spanish_months = {
-            'ene': 'jan', 'feb': 'feb', 'mar': 'mar', 'abr': 'apr',
-            'may': 'may', 'jun': 'jun', 'jul': 'jul', 'ago': 'aug',
-            'sep': 'sep', 'oct': 'oct', 'nov': 'nov', 'dic': 'dec'
-        }
-        
-        normalized_date = date_str.lower()
-        for spanish, english in spanish_months.items():
-            normalized_date = normalized_date.replace(spanish, english)
+    def is_row_start(self, words: List[str]) -> bool:
+        """Whether a table row starts a transaction: its first words form a date ("15 ENE 2024" spans three)"""
+        for n in range(1, min(date_words(self.date_formats), len(words)) + 1):
+            if self._parse_date(" ".join(words[:n])) is not None:
+                return True
+        return False
+    
+    def parse_table(self, table: Table) -> List[Dict]:
+        """Transactions from the rows of a column-mapped table"""
+        transactions = []
+        for row in table.cells:
+            tx = self._transaction_from_fields(dict(zip(table.columns, row)))
+            if tx:
+                transactions.append(tx)
+        return transactions
+    
+    def _transaction_from_fields(self, fields: Dict[str, Optional[str]]) -> Optional[Dict]:
+        """Transaction from named fields (date, description, amount or debit/credit, balance)"""
+        tx_date = self._parse_date(fields.get('date') or '')
+        description = (fields.get('description') or '').strip()
+        if not tx_date or not description:
+            return None
         
-        for fmt in date_formats:
-            try:
-                return datetime.strptime(normalized_date, fmt).date()
-            except ValueError:
-                continue
+        amount, tx_type = fields.get('amount'), 'unknown'
+        if fields.get('debit'):
+            amount, tx_type = fields['debit'], 'debit'
+        elif fields.get('credit'):
+            amount, tx_type = fields['credit'], 'credit'
+        if not amount:
+            return None
         
-        return None
+        tx = {
+            'date': tx_date,
+            'description': description,
+            'amount': abs(self._parse_amount(amount)),
+            'type': tx_type,
+            'currency': 'MXN'
+        }
+        if fields.get('balance'):
+            tx['balance'] = self._parse_amount(fields['balance'])
+        return tx
+    
+    def _parse_date(self, date_str: str) -> Optional[date]:
+        """Parse various date formats used by Mexican banks"""
+        return parse_date(date_str, self.date_formats)
     
     def _parse_amount(self, amount_str: str) -> Decimal:
         """Parse monetary amounts, handling Mexican formatting"""
-        if not amount_str:
-            return Decimal('0')
-        
-        # Remove currency symbols and whitespace
-        cleaned = re.sub(r'[\$\s]', '', amount_str)
-        
-        # Handle thousands separators (commas)
-        cleaned = cleaned.replace(',', '')
-        
-        try:
-            return Decimal(cleaned)
-        except (ValueError, TypeError, Exception):
-            return Decimal('0')
+        return parse_amount(amount_str)
 
 class BBVATemplate(BankTemplate):
     """BBVA Bancomer statement parser"""
     
+    needs_layout = True
+    
+    # BBVA transaction patterns (common formats)
+    patterns = (
+        # Date | Description | Debit | Credit | Balance
+        r'(\d{2}/\d{2}/\d{4})\s+(.+?)\s+(\$[\d,]+\.\d{2})?\s*(\$[\d,]+\.\d{2})?\s+\$[\d,]+\.\d{2}',
+        
+        # Alternative format with different spacing
+        r'(\d{2}-\w{3}-\d{4})\s+(.+?)\s+([\d,]+\.\d{2})\s+([\d,]+\.\d{2})',
+    )
+    pattern_flags = re.IGNORECASE
+    pattern_required = ("/$.", "-.")
+    
+    columns = (
+        Column("date", ("FECHA", "OPER")),
+        Column("description", ("DESCRIPCION", "CONCEPTO")),
+        Column("debit", ("CARGOS", "CARGO")),
+        Column("credit", ("ABONOS", "ABONO")),
+        Column("balance", ("SALDO",)),
+    )
+    
     def parse_transactions(self, pages_text: List[str]) -> List[Dict]:
         transactions = []
         
-        # BBVA transaction patterns (common formats)
-        patterns = [
-            # Date | Description | Debit | Credit | Balance
-            r'(\d{2}/\d{2}/\d{4})\s+(.+?)\s+(\$[\d,]+\.\d{2})?\s*(\$[\d,]+\.\d{2})?\s+\$[\d,]+\.\d{2}',
-            
-            # Alternative format with different spacing
-            r'(\d{2}-\w{3}-\d{4})\s+(.+?)\s+([\d,]+\.\d{2})\s+([\d,]+\.\d{2})',
-        ]
-        
         for page_text in pages_text:
-            lines = page_text.split('\n')
-            
-            for line in lines:
-                for pattern in patterns:
-                    match = re.search(pattern, line, re.IGNORECASE)
-                    if match:
-                        tx = self._parse_bbva_transaction(match, line)
-                        if tx:
-                            transactions.append(tx)
+            for line in page_text.split('\n'):
+                for _, groups in self.pattern_set.search_line(line):
+                    tx = self._parse_bbva_transaction(groups, line)
+                    if tx:
+                        transactions.append(tx)
         
         return transactions
     
-    def _parse_bbva_transaction(self, match, line: str) -> Optional[Dict]:
+    def _parse_bbva_transaction(self, groups: tuple, line: str) -> Optional[Dict]:
         """Parse individual BBVA transaction"""
         try:
-            groups = match.groups()
             date_str = groups[0]
             description = groups[1].strip()
             
@@ -137,17 +254,20 @@ class BBVATemplate(BankTemplate):
 class SantanderTemplate(BankTemplate):
     """Santander Mexico statement parser"""
     
+    needs_layout = True
+    
+    # Santander patterns. \s+ can cross line breaks, so they run over whole pages
+    patterns = (
+        r'(\d{2}/\d{2}/\d{4})\s+(\d{2}/\d{2}/\d{4})\s+(.+?)\s+([\d,]+\.\d{2})\s*([CD])',
+    )
+    pattern_flags = re.MULTILINE
+    pattern_required = ("/.",)
+    
     def parse_transactions(self, pages_text: List[str]) -> List[Dict]:
         transactions = []
         
-        # Santander patterns
-        patterns = [
-            r'(\d{2}/\d{2}/\d{4})\s+(\d{2}/\d{2}/\d{4})\s+(.+?)\s+([\d,]+\.\d{2})\s*([CD])',
-        ]
-        
         for page_text in pages_text:
-            for pattern in patterns:
-                matches = re.findall(pattern, page_text, re.MULTILINE)
+            for _, matches in self.pattern_set.findall_page(page_text):
                 for match in matches:
                     tx = self._parse_santander_transaction(match)
                     if tx:
@@ -180,19 +300,33 @@ class SantanderTemplate(BankTemplate):
 class BanorteTemplate(BankTemplate):
     """Banorte statement parser"""
     
+    needs_layout = True
+    
+    # Banorte often uses table formats
+    patterns = (
+        r'(\d{2}/\d{2}/\d{4})\s+(.{1,50}?)\s+([\d,]+\.\d{2})\s+([\d,]+\.\d{2})',
+    )
+    pattern_required = ("/.",)
+    
+    # Depósitos y retiros van en columnas separadas: solo por posición se distingue el tipo
+    columns = (
+        Column("date", ("FECHA",)),
+        Column("description", ("DESCRIPCION", "CONCEPTO")),
+        Column("credit", ("DEPOSITOS", "DEPOSITO")),
+        Column("debit", ("RETIROS", "RETIRO")),
+        Column("balance", ("SALDO",)),
+    )
+    
     def parse_transactions(self, pages_text: List[str]) -> List[Dict]:
         transactions = []
         
         # Look for transaction tables in Banorte format
         for page_text in pages_text:
-            # Banorte often uses table formats
-            table_pattern = r'(\d{2}/\d{2}/\d{4})\s+(.{1,50}?)\s+([\d,]+\.\d{2})\s+([\d,]+\.\d{2})'
-            matches = re.findall(table_pattern, page_text)
-            
-            for match in matches:
-                tx = self._parse_banorte_transaction(match)
-                if tx:
-                    transactions.append(tx)
+            for _, matches in self.pattern_set.findall_page(page_text):
+                for match in matches:
+                    tx = self._parse_banorte_transaction(match)
+                    if tx:
+                        transactions.append(tx)
         
         return transactions
     
@@ -223,37 +357,48 @@ class BanorteTemplate(BankTemplate):
 
 # === Template Factory ===
 
+# Templates written in Python; other banks are declared in bank_templates/*.json|yaml
+TEMPLATE_CLASSES = {
+    BankBrand.BBVA: BBVATemplate,
+    BankBrand.SANTANDER: SantanderTemplate,
+    BankBrand.BANORTE: BanorteTemplate,
+}
+
 def get_bank_template(bank: BankBrand) -> BankTemplate:
-    """Factory function to get appropriate template for bank"""
-    
-    template_map = {
-        BankBrand.BBVA: BBVATemplate,
-        BankBrand.SANTANDER: SantanderTemplate,
-        BankBrand.BANORTE: BanorteTemplate,
-        # Add more banks as needed
-    }
-    
-    template_class = template_map.get(bank, BankTemplate)
-    return template_class()
+    """Shared template instance for a bank (see template_registry.TEMPLATES)"""
+    from .template_registry import TEMPLATES
+    return TEMPLATES.get(bank)
 
 # === High-level parsing function ===
 
-def parse_bank_statement(bank: BankBrand, pages_text: List[str]) -> Tuple[List[Dict], Dict]:
+def parse_bank_statement(bank: BankBrand, pages_text: List[str],
+                         tables: Optional[List[Table]] = None) -> Tuple[List[Dict], Dict]:
     """
     Parse bank statement using appropriate template.
-    Returns (transactions, metadata).
+    Pages with a table in `tables` are read by column, the rest with the
+    template regexes. Returns (transactions, metadata).
     """
     template = get_bank_template(bank)
     
     try:
-        transactions = template.parse_transactions(pages_text)
+        by_page = {table.page: table for table in tables or ()}
+        transactions = []
+        table_pages = 0
+        for page_num, page_text in enumerate(pages_text):
+            page_txs = template.parse_table(by_page[page_num]) if page_num in by_page else []
+            if page_txs:
+                table_pages += 1
+            else:
+                page_txs = template.parse_transactions([page_text])
+            transactions.extend(page_txs)
         account_info = template.extract_account_info(pages_text)
         
         metadata = {
             'bank': bank.value,
             'total_transactions': len(transactions),
             'account_info': account_info,
-            'parsing_method': template.__class__.__name__
+            'parsing_method': template.__class__.__name__,
+            'table_pages': table_pages
         }
         
         return transactions, metadata
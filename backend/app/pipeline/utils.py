@@ -1,23 +1,26 @@
 # app/pipeline/utils.py
 
+import csv
+import io
+import os
 import re
-from io import BytesIO
+import unicodedata
+import uuid
 from datetime import date
 from typing import List, Dict, Tuple, Optional
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 
 from app.models.bank import BankBrand
 from app.models.transaction import Transaction
+from app.core.config import settings
+from app.core.metrics import bank_label, count_table_error
+from .context import PDF_LIBS_AVAILABLE, PdfSource, open_context
+from .ocr import ocr_dpi_for, ocr_fitz_page, ocr_pages_parallel
+from .tables import NUMPY_AVAILABLE, extract_tables
 
-# PDF processing imports (will be available after pip install)
-try:
-    import fitz  # PyMuPDF
-    import pdfplumber
-    import pytesseract
-    from PIL import Image
-    PDF_LIBS_AVAILABLE = True
-except ImportError:
-    PDF_LIBS_AVAILABLE = False
+# PyMuPDF y pdfplumber se importan en context.py (OCR en ocr.py)
+if not PDF_LIBS_AVAILABLE:
     print("PDF processing libraries not installed. Run: pip install -r requirements.txt")
 
 # === Mexican Bank Detection Patterns ===
@@ -76,23 +79,119 @@ MEXICAN_BANK_PATTERNS = {
     ]
 }
 
+# === Compiled bank detector ===
+# Every pattern is compiled once and counts its own non-overlapping matches,
+# so overlapping keywords ("banco santander" and "santander") still score one
+# hit each. Patterns run case-sensitive over lowercased text: without
+# IGNORECASE the regex engine can jump to each pattern's literal prefix.
+
+_CLABE_WEIGHT = 4      # 1 por la coincidencia + 3 extra, los CLABE son más específicos
+_COMBINING_MARKS = re.compile(r'[\u0300-\u036f]')
+
+def _strip_accents(text: str) -> str:
+    return _COMBINING_MARKS.sub('', unicodedata.normalize('NFD', text))
+
+def _compile_bank_detector():
+    patterns = []
+    for bank, bank_patterns in MEXICAN_BANK_PATTERNS.items():
+        for pattern in bank_patterns:
+            # Los patrones se comparan contra texto sin acentos y en minúsculas
+            weight = _CLABE_WEIGHT if re.match(r'\d{9}', pattern) else 1
+            patterns.append((bank, weight, re.compile(_strip_accents(pattern).lower())))
+    return patterns
+
+_BANK_PATTERNS = _compile_bank_detector()
+_BANK_ORDER = list(MEXICAN_BANK_PATTERNS)
+
+def score_banks(text: str) -> Dict[BankBrand, int]:
+    """Score banks over accent-stripped text: weighted matches of every pattern"""
+    text = text.lower()
+    scores: Dict[BankBrand, int] = {}
+    for bank, weight, pattern in _BANK_PATTERNS:
+        matches = len(pattern.findall(text))
+        if matches:
+            scores[bank] = scores.get(bank, 0) + matches * weight
+    return scores
+
 # === PDF Text Extraction Functions ===
 
-def extract_text_pages(file_path: str) -> List[str]:
+EXTRACTION_STRATEGIES = ("fast", "layout", "auto")
+
+def extract_text_pages(source: PdfSource, max_pages: Optional[int] = None,
+                       needs_layout: bool = False) -> List[str]:
     """
     Extract text from PDF pages using multiple methods for reliability.
     Returns list of strings, one per page.
+    Accepts a file path or a DocumentContext; results are memoized on the context.
+    With max_pages only pages 0..max_pages-1 are extracted, so classifying a
+    300-page statement costs the same as a 3-page one.
+
+    EXTRACTION_STRATEGY picks the extractor:
+      - "layout": pdfplumber first, PyMuPDF if no page has text (original behaviour)
+      - "fast":   PyMuPDF only
+      - "auto":   PyMuPDF per page, pdfplumber for pages that fail the quality
+                  check or when the bank template needs column-accurate layout
     """
     if not PDF_LIBS_AVAILABLE:
         raise ImportError("PDF processing libraries not available. Install with: pip install PyPDF2 pdfplumber pymupdf")
     
+    strategy = settings.EXTRACTION_STRATEGY.lower()
+    if strategy not in EXTRACTION_STRATEGIES:
+        raise ValueError(f"Unknown EXTRACTION_STRATEGY: {strategy!r}")
+    if strategy == "auto" and needs_layout:
+        strategy = "layout"
+    
+    with open_context(source) as ctx:
+        if max_pages is not None and not ctx.is_local:
+            # Solo pdfplumber lee por rangos; no descargar el archivo solo para clasificar
+            strategy = "layout"
+        if strategy in ctx.pages_text:
+            return ctx.pages_text[strategy][:max_pages]
+        if strategy == "layout":
+            pages_text = _extract_text_pages(ctx, max_pages)
+        else:
+            pages_text = _extract_text_pages_fast(ctx, max_pages, fallback=(strategy == "auto"))
+        if max_pages is None or max_pages >= ctx.page_count:
+            ctx.pages_text[strategy] = pages_text
+        return pages_text
+
+def _page_range(ctx, max_pages: Optional[int]) -> range:
+    if max_pages is None:
+        return range(ctx.page_count)
+    return range(min(max_pages, ctx.page_count))
+
+def _fast_text_ok(text: str) -> bool:
+    """Quality heuristic for PyMuPDF output: enough text and few undecodable glyphs"""
+    stripped = text.strip()
+    if len(stripped) <= 50:
+        return False
+    return stripped.count('\ufffd') <= len(stripped) * 0.02
+
+def _extract_text_pages_fast(ctx, max_pages: Optional[int], fallback: bool) -> List[str]:
     pages_text = []
     
     try:
-        with pdfplumber.open(file_path) as pdf:
-            for page in pdf.pages:
-                text = page.extract_text()
-                pages_text.append(text or "")
+        for page_num in _page_range(ctx, max_pages):
+            text = ctx.fitz_page_text(page_num)
+            if fallback and not _fast_text_ok(text):
+                try:
+                    text = ctx.plumber_page_text(page_num) or text
+                except Exception as e:
+                    print(f"pdfplumber failed on page {page_num + 1}: {e}")
+            pages_text.append(text)
+        
+    except Exception as e:
+        print(f"PyMuPDF failed: {e}")
+        pages_text = []
+    
+    return pages_text
+
+def _extract_text_pages(ctx, max_pages: Optional[int] = None) -> List[str]:
+    pages_text = []
+    
+    try:
+        for page_num in _page_range(ctx, max_pages):
+            pages_text.append(ctx.plumber_page_text(page_num))
         
        
         if any(len(text.strip()) > 50 for text in pages_text):
@@ -103,12 +202,8 @@ def extract_text_pages(file_path: str) -> List[str]:
     
     try:
         pages_text = []
-        doc = fitz.open(file_path)
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            text = page.get_text()
-            pages_text.append(text or "")
-        doc.close()
+        for page_num in _page_range(ctx, max_pages):
+            pages_text.append(ctx.fitz_page_text(page_num))
         
     except Exception as e:
         print(f"PyMuPDF failed: {e}")
@@ -116,7 +211,7 @@ def extract_text_pages(file_path: str) -> List[str]:
     
     return pages_text
 
-def is_scanned_pdf(file_path: str) -> bool:
+def is_scanned_pdf(source: PdfSource) -> bool:
     """
     Detect if PDF is scanned (image-based) vs text-based.
     """
@@ -124,20 +219,15 @@ def is_scanned_pdf(file_path: str) -> bool:
         return False 
         
     try:
-        doc = fitz.open(file_path)
-        total_chars = 0
-        total_images = 0
-        
-        for page_num in range(min(3, len(doc))): 
-            page = doc.load_page(page_num)
-            text = page.get_text()
-            total_chars += len(text.strip())
+        with open_context(source) as ctx:
+            total_chars = 0
+            total_images = 0
             
-            # Count images on page
-            image_list = page.get_images()
-            total_images += len(image_list)
-        
-        doc.close()
+            for page_num in range(min(3, ctx.page_count)): 
+                total_chars += len(ctx.quick_page_text(page_num).strip())
+                
+                # Count images on page
+                total_images += ctx.image_count(page_num)
         
         if total_chars < 100 and total_images > 0:
             return True
@@ -151,42 +241,32 @@ def is_scanned_pdf(file_path: str) -> bool:
         print(f"Error detecting PDF type: {e}")
         return False
 
-def maybe_ocr(file_path: str) -> List[str]:
+def maybe_ocr(source: PdfSource, bank: Optional[BankBrand] = None) -> List[str]:
     """
     Perform OCR on PDF pages when text extraction fails or PDF is scanned.
     Returns list of extracted text per page.
+    The render DPI can be tuned per bank (OCR_DPI_BY_BANK).
     """
     if not PDF_LIBS_AVAILABLE:
         print("OCR libraries not available")
         return []
         
+    with open_context(source) as ctx:
+        if ctx.ocr_text is None:
+            ctx.ocr_text = _ocr_pages(ctx, ocr_dpi_for(bank), bank_label(bank))
+        return ctx.ocr_text
+
+def _ocr_pages(ctx, dpi: int, bank: Optional[str] = None) -> List[str]:
     pages_text = []
     
     try:
-        # Convert PDF pages to images and run OCR
-        doc = fitz.open(file_path)
-        
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            
-            # Convert to image
-            mat = fitz.Matrix(2.0, 2.0)  # 2x zoom for better OCR
-            pix = page.get_pixmap(matrix=mat)
-            img_data = pix.tobytes("png")
-            
-            # Convert to PIL Image
-            img = Image.open(BytesIO(img_data))
-            
-            # Run OCR with Spanish language support
-            text = pytesseract.image_to_string(
-                img, 
-                lang='spa+eng',  
-                config='--psm 6' 
-            )
-            
-            pages_text.append(text)
-        
-        doc.close()
+        page_count = ctx.page_count
+        if settings.OCR_MAX_WORKERS > 1 and page_count > 1:
+            # Una tarea por página repartida en el pool de OCR
+            pages_text = ocr_pages_parallel(ctx.file_path, page_count, dpi, bank)
+        else:
+            for page_num in range(page_count):
+                pages_text.append(ocr_fitz_page(ctx.fitz_doc.load_page(page_num), dpi, bank))
         
     except Exception as e:
         print(f"OCR failed: {e}")
@@ -196,55 +276,37 @@ def maybe_ocr(file_path: str) -> List[str]:
 
 # === Bank Detection ===
 
-def detect_bank(file_path: str) -> Optional[BankBrand]:
+def detect_bank(source: PdfSource) -> Optional[BankBrand]:
     """
     Detect which Mexican bank issued the statement by analyzing PDF content.
     The detection is based on keyword and pattern matching.
     """
-    # Extract text from first few pages
-    pages_text = extract_text_pages(file_path)
+    # Extract text from first few pages only
+    pages_text = extract_text_pages(source, max_pages=3)
     
     if not pages_text:
         return BankBrand.UNKNOWN
     
     # Combine first 2-3 pages for bank detection
-    combined_text = " ".join(pages_text[:3]).lower()
-    
-    # Remove accents and normalize text for better matching
-    import unicodedata
-    normalized_text = unicodedata.normalize('NFD', combined_text)
-    normalized_text = ''.join(c for c in normalized_text if unicodedata.category(c) != 'Mn')
+    normalized_text = _strip_accents(" ".join(pages_text[:3]))
     
     # Score each bank based on pattern matches
-    bank_scores = {}
-    
-    for bank, patterns in MEXICAN_BANK_PATTERNS.items():
-        score = 0
-        for pattern in patterns:
-            matches = re.findall(pattern, normalized_text, re.IGNORECASE)
-            score += len(matches)
-            
-            # Give extra weight to CLABE codes (more specific)
-            if re.match(r'\d{9}', pattern):
-                score += len(matches) * 3
-        
-        if score > 0:
-            bank_scores[bank] = score
+    bank_scores = score_banks(normalized_text)
     
     if not bank_scores:
         return BankBrand.UNKNOWN
     
-    # Return bank with highest score
-    return max(bank_scores.items(), key=lambda x: x[1])[0]
+    # Return bank with highest score (ties go to the first bank listed)
+    return max((bank for bank in _BANK_ORDER if bank in bank_scores), key=bank_scores.get)
 
 # === Period Detection ===
 
-def detect_period(file_path: str) -> Tuple[Optional[date], Optional[date]]:
+def detect_period(source: PdfSource) -> Tuple[Optional[date], Optional[date]]:
     """
     Extract statement period (start and end dates) from PDF.
     Returns tuple of (start_date, end_date).
     """
-    pages_text = extract_text_pages(file_path)
+    pages_text = extract_text_pages(source, max_pages=2)
     
     if not pages_text:
         return None, None
@@ -304,13 +366,60 @@ def detect_period(file_path: str) -> Tuple[Optional[date], Optional[date]]:
 
 # === Placeholder functions (to be implemented based on your specific needs) ===
 
-def parse_with_template(bank: BankBrand, pages_text: List[str], file_path: str) -> Tuple[List[Dict], Dict]:
+def reads_tables(template) -> bool:
+    """Whether parse_with_template reads the template's transactions by column"""
+    return bool(template.columns) and NUMPY_AVAILABLE
+
+def text_needs_layout(template) -> bool:
+    """
+    Whether the text stage must lay out every page with pdfplumber. Not for
+    templates read by column: parse_with_template lays out only the pages
+    left to the regexes.
+    """
+    return template.needs_layout and not reads_tables(template)
+
+def _layout_text(ctx, pages_text: List[str], skip) -> List[str]:
+    """pdfplumber text for the pages not in `skip` whose text is PyMuPDF's (OCR text is kept)"""
+    if settings.EXTRACTION_STRATEGY.lower() == "layout":
+        return pages_text
+    result = list(pages_text)
+    for page_num, text in enumerate(pages_text):
+        if page_num in skip:
+            continue
+        try:
+            if text == ctx.fitz_page_text(page_num):
+                result[page_num] = ctx.plumber_page_text(page_num) or text
+        except Exception as e:
+            print(f"pdfplumber failed on page {page_num + 1}: {e}")
+    return result
+
+def parse_with_template(bank: BankBrand, pages_text: List[str], source: PdfSource) -> Tuple[List[Dict], Dict]:
     """
     Parse transactions using bank-specific templates.
+    Templates that declare table columns read the word boxes of the PDF
+    (see tables.py); pages without a table (e.g. OCR output) fall back to the regexes.
     Returns (raw_transactions, metadata).
     """
-    from .templates import parse_bank_statement
-    return parse_bank_statement(bank, pages_text)
+    from .templates import get_bank_template, parse_bank_statement
+    template = get_bank_template(bank)
+    tables = None
+    table_error = None
+    if reads_tables(template):
+        with open_context(source) as ctx:
+            try:
+                # Solo las páginas extraídas (max_pages): el resto no se parsea
+                tables = extract_tables(ctx, template.columns, template.is_row_start, max_pages=len(pages_text))
+            except Exception as e:
+                print(f"Table extraction failed: {e}")
+                table_error = str(e)
+                count_table_error(bank)
+            if template.needs_layout:
+                # El texto se extrajo sin layout (text_needs_layout): las regex lo necesitan en las páginas sin tabla
+                pages_text = _layout_text(ctx, pages_text, {table.page for table in tables or ()})
+    transactions, metadata = parse_bank_statement(bank, pages_text, tables)
+    if table_error is not None:
+        metadata['table_error'] = table_error
+    return transactions, metadata
 
 def normalize_transactions(raw_transactions: List[Dict]) -> List[Dict]:
     """
@@ -356,14 +465,59 @@ def validate_report(transactions: List[Dict], start_date: date, end_date: date)
     
     return True, "Validation passed"
 
+_TRANSACTION_COLUMNS = ('id', 'document_id', 'date', 'description', 'amount', 'currency', 'type', 'balance')
+
+def _uuid_batch(n: int) -> List[str]:
+    """n random (version 4) UUIDs from a single os.urandom call"""
+    raw = os.urandom(16 * n)
+    return [str(uuid.UUID(bytes=raw[i:i + 16], version=4)) for i in range(0, 16 * n, 16)]
+
 def persist_transactions(db: Session, doc_id: str, transactions: List[Dict]):
     """
     Save normalized transactions to database.
+    Rows go through Core bulk inserts (executemany) or, on PostgreSQL for large
+    documents, COPY FROM STDIN. Nothing is committed here: the caller commits
+    together with the final status update so the document stays consistent.
     """
-    for tx_data in transactions:
-        transaction = Transaction(
-            document_id=doc_id,
-            **tx_data
+    if not transactions:
+        return
+    
+    ids = _uuid_batch(len(transactions))
+    rows = [
+        {
+            'id': tx_id,
+            'document_id': doc_id,
+            'date': tx.get('date'),
+            'description': tx.get('description'),
+            'amount': tx.get('amount'),
+            'currency': tx.get('currency') or 'MXN',
+            'type': tx.get('type'),
+            'balance': tx.get('balance'),
+        }
+        for tx_id, tx in zip(ids, transactions)
+    ]
+    
+    if db.get_bind().dialect.name == 'postgresql' and len(rows) >= settings.PERSIST_COPY_THRESHOLD:
+        _copy_transactions(db, rows)
+        return
+    
+    stmt = insert(Transaction.__table__)
+    batch_size = settings.PERSIST_BATCH_SIZE
+    for start in range(0, len(rows), batch_size):
+        db.execute(stmt, rows[start:start + batch_size])
+
+def _copy_transactions(db: Session, rows: List[Dict]):
+    """COPY rows through the session's own connection, inside its transaction"""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        # Celda vacía sin comillas = NULL en COPY ... CSV
+        writer.writerow(['' if row[col] is None else row[col] for col in _TRANSACTION_COLUMNS])
+    buf.seek(0)
+    
+    dbapi_conn = db.connection().connection.dbapi_connection
+    with dbapi_conn.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY transactions ({', '.join(_TRANSACTION_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buf,
         )
-        db.add(transaction)
-    db.commit()
\ No newline at end of file
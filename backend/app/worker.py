@@ -0,0 +1,171 @@
+# app/worker.py
+"""
+Standalone pipeline worker.
+
+    python -m app.worker [--concurrency N]
+
+Claims jobs from the `jobs` table and runs them on the configured executor
+(EXECUTOR_BACKEND). Any number of workers can run across nodes; SKIP LOCKED
+keeps them from claiming the same job.
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import time
+import uuid
+from concurrent.futures import BrokenExecutor, Future
+from typing import Dict, List, Tuple
+
+from app.core.config import settings
+from app.core.db import SessionLocal, init_db
+from app.core.executor import build_executor
+from app.core.metrics import PROMETHEUS_AVAILABLE, start_metrics_server
+from app.core.queue import claim_jobs, complete_job, extend_locks, fail_job, release_jobs
+from app.core.state import flush_timings, set_status
+from app.models.document import Document, DocStatus
+from app.pipeline.stages import run_pipeline
+
+logger = logging.getLogger(__name__)
+
+
+def run_job(job_id: str, doc_id: str, worker_id: str) -> None:
+    """Executor task: run the pipeline for one job and record the outcome"""
+    db = SessionLocal()
+    try:
+        try:
+            doc = db.get(Document, doc_id)
+            if doc is None:
+                raise LookupError(f"document {doc_id} not found")
+            run_pipeline(db, doc)
+            if doc.status != DocStatus.FAILED:
+                set_status(db, doc_id, DocStatus.DONE)
+            complete_job(db, job_id, worker_id)
+        except Exception as e:
+            db.rollback()
+            logger.exception(f"Job {job_id} (doc {doc_id}) failed")
+            _save_timings(db, doc_id)
+            if fail_job(db, job_id, worker_id, str(e)):
+                set_status(db, doc_id, DocStatus.FAILED, error=str(e))
+    finally:
+        db.close()
+
+
+def _save_timings(db, doc_id: str) -> None:
+    """Keep the stage timings of a failed attempt: the slow and failing runs are the ones worth seeing"""
+    try:
+        flush_timings(db)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"Could not store stage timings of doc {doc_id}: {e}")
+
+
+class Worker:
+    def __init__(self, concurrency: int, poll_interval: float):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.executor = build_executor(max_workers=concurrency)
+        self.running: Dict[str, Tuple[str, Future]] = {}  # job_id -> (doc_id, future)
+        self.stopping = False
+        self._last_heartbeat = 0.0
+
+    def stop(self, *_):
+        logger.info("Stopping worker, waiting for running jobs...")
+        self.stopping = True
+
+    def _reap(self):
+        for job_id, (doc_id, future) in list(self.running.items()):
+            if future.done():
+                del self.running[job_id]
+                exc = future.exception()
+                if exc is not None:
+                    # run_job no llegó a registrar el resultado (p. ej. BrokenProcessPool: murió el proceso hijo)
+                    logger.error(f"Job {job_id} crashed in executor: {exc!r}")
+                    self._fail_crashed(job_id, doc_id, f"executor crashed: {exc!r}")
+
+    def _fail_crashed(self, job_id: str, doc_id: str, error: str):
+        db = SessionLocal()
+        try:
+            if fail_job(db, job_id, self.worker_id, error):
+                set_status(db, doc_id, DocStatus.FAILED, error=error)
+        except Exception as e:  # noqa: BLE001
+            db.rollback()
+            logger.warning(f"Could not record crash of job {job_id}: {e}")
+        finally:
+            db.close()
+
+    def _submit(self, claimed: List[Tuple[str, str]]):
+        for i, (job_id, doc_id) in enumerate(claimed):
+            try:
+                self.running[job_id] = (doc_id, self.executor.submit(run_job, job_id, doc_id, self.worker_id))
+            except Exception as e:  # noqa: BLE001
+                logger.error(f"Could not submit job {job_id}: {e!r}")
+                if isinstance(e, BrokenExecutor):
+                    # Un proceso hijo murió: el pool ya no acepta tareas
+                    self.executor.shutdown(wait=False)
+                    self.executor = build_executor(max_workers=self.concurrency)
+                # Los jobs reclamados que no arrancaron vuelven a la cola sin gastar un intento
+                self._release([job for job, _ in claimed[i:]])
+                return
+
+    def _release(self, job_ids: List[str]):
+        db = SessionLocal()
+        try:
+            release_jobs(db, job_ids, self.worker_id)
+        except Exception as e:  # noqa: BLE001
+            db.rollback()
+            logger.warning(f"Could not release jobs {job_ids}: {e}")
+        finally:
+            db.close()
+
+    def _heartbeat(self, db):
+        interval = settings.QUEUE_VISIBILITY_TIMEOUT_SEC / 3
+        if self.running and time.monotonic() - self._last_heartbeat >= interval:
+            extend_locks(db, self.worker_id, list(self.running))
+            self._last_heartbeat = time.monotonic()
+
+    def run(self):
+        logger.info(f"Worker {self.worker_id} started (concurrency={self.concurrency})")
+        while not (self.stopping and not self.running):
+            self._reap()
+            db = SessionLocal()
+            try:
+                self._heartbeat(db)
+                free = self.concurrency - len(self.running)
+                claimed = []
+                if free > 0 and not self.stopping:
+                    claimed = claim_jobs(db, self.worker_id, free)
+            except Exception as e:  # noqa: BLE001
+                db.rollback()
+                logger.warning(f"Queue poll failed: {e}")
+                claimed = []
+            finally:
+                db.close()
+            self._submit(claimed)
+            if not claimed:
+                time.sleep(self.poll_interval)
+        self.executor.shutdown(wait=True)
+        logger.info(f"Worker {self.worker_id} stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banky pipeline worker")
+    parser.add_argument("--concurrency", type=int, default=settings.EXECUTOR_MAX_WORKERS)
+    parser.add_argument("--poll-interval", type=float, default=settings.QUEUE_POLL_INTERVAL_SEC)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.LOG_LEVEL)
+    init_db()
+    if settings.METRICS_PORT and PROMETHEUS_AVAILABLE:
+        start_metrics_server(settings.METRICS_PORT)
+    worker = Worker(args.concurrency, args.poll_interval)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+# benchmarks/run.py
+"""
+Pipeline benchmark suite.
+
+    python -m benchmarks.run [--quick] [--output benchmarks/baseline.json]
+    python -m benchmarks.run --compare benchmarks/baseline.json [--threshold 0.2]
+
+Generates synthetic BBVA, Santander and Banorte statements (text and scanned
+variants, see benchmarks/synthetic.py), times every stage function of
+app/pipeline/utils.py and the template parsers of templates.py, then runs
+the whole pipeline (process_document) end to end. The database is a fresh
+SQLite file unless --database-url points to a local, migrated PostgreSQL.
+
+Results are written as JSON. --compare re-runs the suite with the baseline's
+parameters, prints the cases that got slower than --threshold and
+exits with status 1 if there is any regression.
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+PROFILES = {
+    "quick": {"pages": 2, "transactions": 60, "repeat": 3},
+    "full": {"pages": 5, "transactions": 250, "repeat": 5},
+}
+
+# Texto de estados de cuenta con palabras clave que se solapan entre patrones
+BANK_SAMPLES = (
+    "BANCO SANTANDER MEXICO S.A. Estado de cuenta. Santander Mexico. CLABE 014180001234567890. "
+    "Transferencia SPEI a BBVA. Pago recibido de BBVA. Devolucion BBVA",
+    "Banco Azteca. Estado de cuenta Guardadito. Pago tarjeta Amex, Amex",
+    "BBVA Bancomer, S.A. BBVA Mexico. Banco Bilbao Vizcaya Argentaria. CLABE 012180002",
+    "Citibanamex / Banamex, Banco Nacional de México. 002180002. Pago HSBC Mexico",
+    "American Express Company (Mexico). AMEX Gold. Pago Banorte, Banco del Norte",
+)
+
+
+def _reference_bank_scores(text: str) -> dict:
+    """Bank scores as computed before the compiled detector: one re.findall per pattern"""
+    from app.pipeline.utils import MEXICAN_BANK_PATTERNS, _strip_accents
+    scores = {}
+    for bank, patterns in MEXICAN_BANK_PATTERNS.items():
+        score = 0
+        for pattern in patterns:
+            matches = re.findall(_strip_accents(pattern), text, re.IGNORECASE)
+            score += len(matches) * (4 if re.match(r'\d{9}', pattern) else 1)
+        if score > 0:
+            scores[bank] = score
+    return scores
+
+
+class Suite:
+    """Collects timings keyed by "<function>@<case>" """
+
+    def __init__(self, repeat: int):
+        self.repeat = repeat
+        self.results: Dict[str, dict] = {}
+
+    def bench(self, name: str, case: str, fn: Callable, setup: Optional[Callable] = None,
+              repeat: Optional[int] = None, warmup: bool = True, **extra):
+        """
+        Time fn() `repeat` times (setup() runs untimed before each call) and
+        return its last result. A first untimed call warms imports and caches.
+        """
+        samples = []
+        result = None
+        if warmup:
+            if setup is not None:
+                setup()
+            fn()
+        for _ in range(repeat or self.repeat):
+            if setup is not None:
+                setup()
+            started = time.perf_counter()
+            result = fn()
+            samples.append((time.perf_counter() - started) * 1000)
+        self.record(name, case, samples, **extra)
+        return result
+
+    def record(self, name: str, case: str, samples, **extra) -> None:
+        entry = {
+            "median_ms": round(statistics.median(samples), 4),
+            "min_ms": round(min(samples), 4),
+            "mean_ms": round(statistics.fmean(samples), 4),
+            "runs": len(samples),
+        }
+        entry.update(extra)
+        self.results[f"{name}@{case}"] = entry
+        print(f"  {name:<48} {case:<18} {entry['median_ms']:>10.2f} ms")
+
+    def skip(self, name: str, case: str, reason: str) -> None:
+        self.results[f"{name}@{case}"] = {"skipped": reason}
+        print(f"  {name:<48} {case:<18}    skipped ({reason})")
+
+
+def _configure_env(args, workdir: str) -> None:
+    """Settings are read at import time: point the app at the benchmark DB and storage first"""
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    os.environ["STORAGE_BACKEND"] = "local"
+    os.environ["STORAGE_LOCAL_ROOT"] = os.path.join(workdir, "storage")
+    # Sin caché de páginas: se mide la extracción en frío
+    os.environ["PAGE_CACHE_ENABLED"] = "true" if args.page_cache else "false"
+    os.environ["METRICS_PORT"] = "0"
+
+
+def _ocr_available() -> bool:
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+@contextmanager
+def _strategy(settings, name: str):
+    previous = settings.EXTRACTION_STRATEGY
+    settings.EXTRACTION_STRATEGY = name
+    try:
+        yield
+    finally:
+        settings.EXTRACTION_STRATEGY = previous
+
+
+def _accuracy(parsed, expected) -> dict:
+    """How many rows the parser found, and how many match the reference row by row"""
+    matched = sum(
+        1 for got, want in zip(parsed, expected)
+        if got.get("date") == want["date"] and got.get("amount") == want["amount"]
+    )
+    typed = sum(1 for got, want in zip(parsed, expected) if got.get("type") == want["type"])
+    return {"parsed": len(parsed), "expected": len(expected), "matched": matched, "type_matched": typed}
+
+
+def run_suite(params: dict, args, workdir: str) -> dict:
+    _configure_env(args, workdir)
+
+    # Imports after _configure_env so Settings, the engines and STORAGE pick up the benchmark setup
+    from sqlalchemy import delete
+    from app.core.config import settings
+    from app.core.db import SessionLocal, engine
+    from app.core.storage import STORAGE, hash_file
+    from app.database.base import Base
+    from app.models.artifact import DocumentArtifact
+    from app.models.document import Document, DocStatus
+    from app.models.transaction import Transaction
+    import app.models.job, app.models.stage_event  # noqa: F401,E401  (tablas para create_all)
+    from app.pipeline import templates
+    from app.pipeline.context import DocumentContext
+    from app.pipeline.tables import extract_tables
+    from app.pipeline.stages import process_document
+    from app.pipeline.utils import (EXTRACTION_STRATEGIES, detect_bank, detect_period, extract_text_pages,
+                                    is_scanned_pdf, maybe_ocr, normalize_transactions, parse_with_template,
+                                    persist_transactions, score_banks, text_needs_layout, validate_report,
+                                    _strip_accents)
+
+    from .synthetic import BANKS, generate_statement
+
+    if engine.dialect.name == "sqlite":
+        Base.metadata.create_all(engine)
+
+    suite = Suite(params["repeat"])
+    ocr = _ocr_available()
+    banks = [b for b in BANKS if not args.banks or b.value in args.banks]
+    variants = ["text"] + ([] if args.no_scanned else ["scanned"])
+
+    for bank in banks:
+        template = templates.get_bank_template(bank)
+        for variant in variants:
+            case = f"{bank.value}/{variant}"
+            print(f"{case}:")
+            stmt = generate_statement(bank, pages=params["pages"], transactions=params["transactions"],
+                                      scanned=(variant == "scanned"), seed=params["seed"])
+            path = os.path.join(workdir, f"{bank.value.lower()}-{variant}.pdf")
+            with open(path, "wb") as f:
+                f.write(stmt.pdf)
+
+            # --- Clasificación ---
+            suite.bench("utils.is_scanned_pdf", case, lambda: is_scanned_pdf(path))
+            suite.bench("utils.detect_bank", case, lambda: detect_bank(path))
+            suite.bench("utils.detect_period", case, lambda: detect_period(path))
+
+            # --- Texto ---
+            if variant == "text":
+                for name in EXTRACTION_STRATEGIES:
+                    with _strategy(settings, name):
+                        suite.bench(f"utils.extract_text_pages[{name}]", case, lambda: extract_text_pages(path))
+                pages_text = extract_text_pages(path, needs_layout=text_needs_layout(template))
+                # Las regex leen texto con layout: así lo reciben en las páginas sin tabla
+                regex_text = extract_text_pages(path, needs_layout=template.needs_layout)
+            elif ocr:
+                pages_text = suite.bench("utils.maybe_ocr", case, lambda: maybe_ocr(path, bank),
+                                         repeat=1, warmup=False)
+            else:
+                suite.skip("utils.maybe_ocr", case, "tesseract not installed")
+                pages_text = []
+            if not pages_text:
+                continue
+            if variant != "text":
+                regex_text = pages_text
+
+            joined = " ".join(pages_text[:3])
+            suite.bench("utils.score_banks", case, lambda: score_banks(joined),
+                        matches_reference=score_banks(joined) == _reference_bank_scores(joined))
+
+            # --- Parseo ---
+            suite.bench("templates.get_bank_template", case, lambda: templates.get_bank_template(bank))
+            raw = suite.bench(f"templates.{type(template).__name__}.parse_transactions", case,
+                              lambda: template.parse_transactions(regex_text))
+            suite.results[f"templates.{type(template).__name__}.parse_transactions@{case}"].update(
+                _accuracy(raw, stmt.transactions))
+            suite.bench("templates.parse_bank_statement", case,
+                        lambda: templates.parse_bank_statement(bank, regex_text))
+            if template.columns and variant == "text":
+                with DocumentContext(path) as ctx:
+                    # Solo el agrupamiento en filas y columnas; las palabras ya están en el contexto
+                    [ctx.page_words(i) for i in range(ctx.page_count)]
+                    suite.bench("tables.extract_tables", case,
+                                lambda: extract_tables(ctx, template.columns, template.is_row_start))
+            raw, _ = suite.bench("utils.parse_with_template", case,
+                                 lambda: parse_with_template(bank, pages_text, path))
+            suite.results[f"utils.parse_with_template@{case}"].update(_accuracy(raw, stmt.transactions))
+            norm = suite.bench("utils.normalize_transactions", case, lambda: normalize_transactions(raw))
+            suite.bench("utils.validate_report", case,
+                        lambda: validate_report(norm, stmt.period_start, stmt.period_end))
+
+            # --- Persistencia y pipeline completo ---
+            if args.no_e2e:
+                continue
+            sha = hash_file(path)
+            key = STORAGE.key_for(sha)
+            staged = path + ".staged"
+            shutil.copyfile(path, staged)
+            STORAGE.put_file(staged, key)
+            db = SessionLocal()
+            try:
+                doc = db.query(Document).filter_by(file_hash=sha).first()
+                if doc is None:
+                    doc = Document(filename=os.path.basename(path), content_type="application/pdf",
+                                   storage_path=key, file_hash=sha)
+                    db.add(doc)
+                    db.commit()
+                doc_id = doc.id
+
+                def clear_transactions():
+                    db.execute(delete(Transaction).where(Transaction.document_id == doc_id))
+                    db.commit()
+
+                def persist():
+                    persist_transactions(db, doc_id, norm)
+                    db.commit()
+
+                if norm:
+                    suite.bench("utils.persist_transactions", case, persist, setup=clear_transactions,
+                                transactions=len(norm))
+
+                def reset_document():
+                    # Sin artefactos el pipeline se ejecuta completo en cada repetición
+                    db.execute(delete(DocumentArtifact).where(DocumentArtifact.document_id == doc_id))
+                    db.execute(delete(Transaction).where(Transaction.document_id == doc_id))
+                    db.query(Document).filter_by(id=doc_id).update({"status": DocStatus.INGESTED, "error": None})
+                    db.commit()
+
+                suite.bench("pipeline.process_document", case, lambda: process_document(doc_id),
+                            setup=reset_document, repeat=1 if variant == "scanned" else None, warmup=False)
+                db.expire_all()
+                status = db.get(Document, doc_id).status
+                suite.results[f"pipeline.process_document@{case}"]["status"] = status.value
+            finally:
+                db.close()
+
+    # --- Micro: parseo de fechas y montos ---
+    print("templates (micro):")
+    tpl = templates.BankTemplate()
+    dates = [f"{d:02d}/{m:02d}/2024" for m in range(1, 13) for d in range(1, 29)]
+    dates += [f"{d:02d}-{mon}-2024" for mon in ("ene", "abr", "ago", "dic") for d in range(1, 29)]
+    amounts = [f"${n * 37.13:,.2f}" for n in range(1, 501)]
+    suite.bench("templates.BankTemplate._parse_date", f"x{len(dates)}",
+                lambda: [tpl._parse_date(s) for s in dates])
+    suite.bench("templates.BankTemplate._parse_amount", f"x{len(amounts)}",
+                lambda: [tpl._parse_amount(s) for s in amounts])
+    samples = [_strip_accents(text) for text in BANK_SAMPLES]
+    suite.bench("utils.score_banks", f"samples x{len(samples)}", lambda: [score_banks(t) for t in samples],
+                matches_reference=all(score_banks(t) == _reference_bank_scores(t) for t in samples))
+
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": engine.dialect.name,
+            "ocr": ocr,
+            "params": params,
+            "settings": {
+                "EXTRACTION_STRATEGY": settings.EXTRACTION_STRATEGY,
+                "PAGE_CACHE_ENABLED": settings.PAGE_CACHE_ENABLED,
+                "STAGE_JOURNAL_BATCH": settings.STAGE_JOURNAL_BATCH,
+                "OCR_MAX_WORKERS": settings.OCR_MAX_WORKERS,
+            },
+        },
+        "results": suite.results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float, min_delta_ms: float, metric: str) -> int:
+    """Print timing changes against a baseline; returns the number of regressions"""
+    regressions = 0
+    rows = []
+    for key, now in current["results"].items():
+        before = baseline["results"].get(key)
+        if before is None or metric not in before or metric not in now:
+            continue
+        base, cur = before[metric], now[metric]
+        ratio = cur / base if base else float("inf")
+        regressed = ratio > 1 + threshold and cur - base > min_delta_ms
+        regressions += regressed
+        rows.append((key, base, cur, ratio, regressed))
+
+    print(f"\n{'case':<64} {'baseline':>10} {'current':>10} {'change':>8}")
+    for key, base, cur, ratio, regressed in sorted(rows, key=lambda r: -r[3]):
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{key:<64} {base:>10.2f} {cur:>10.2f} {(ratio - 1) * 100:>+7.1f}%{flag}")
+
+    missing = set(baseline["results"]) - set(current["results"])
+    if missing:
+        print(f"\n{len(missing)} baseline case(s) not run")
+    print(f"\n{regressions} regression(s) of {metric} above {threshold:.0%} (and {min_delta_ms} ms)")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Banky pipeline benchmarks")
+    parser.add_argument("--quick", action="store_true", help="small statements, fewer repetitions")
+    parser.add_argument("--pages", type=int)
+    parser.add_argument("--transactions", type=int)
+    parser.add_argument("--repeat", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--banks", nargs="*", help="BBVA SANTANDER BANORTE (default: all)")
+    parser.add_argument("--no-scanned", action="store_true", help="skip the rasterized variants")
+    parser.add_argument("--no-e2e", action="store_true", help="skip persist_transactions and process_document")
+    parser.add_argument("--page-cache", action="store_true", help="keep the on-disk page text cache enabled")
+    parser.add_argument("--database-url", help="local PostgreSQL (already migrated); default: temporary SQLite")
+    parser.add_argument("--output", help=f"write results here (default without --compare: {DEFAULT_BASELINE})")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare against a previous results file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown (0.2 = 20%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05, help="ignore slowdowns smaller than this")
+    parser.add_argument("--metric", choices=("min_ms", "median_ms", "mean_ms"), default="min_ms",
+                        help="statistic compared; best-of-N is the least sensitive to noise")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        # Mismos parámetros que la línea base salvo que se indiquen otros
+        params = dict(baseline["meta"]["params"])
+    else:
+        params = dict(PROFILES["quick" if args.quick else "full"], seed=args.seed)
+    for name in ("pages", "transactions", "repeat"):
+        if getattr(args, name) is not None:
+            params[name] = getattr(args, name)
+    if args.quick and args.compare:
+        params.update(PROFILES["quick"])
+
+    workdir = tempfile.mkdtemp(prefix="banky-bench-")
+    try:
+        current = run_suite(params, args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = args.output or (None if args.compare else DEFAULT_BASELINE)
+    if output:
+        with open(output, "w") as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+        print(f"\nResults written to {output}")
+
+    # Un cambio de velocidad no debe cambiar qué banco se detecta
+    mismatched = [key for key, entry in current["results"].items() if entry.get("matches_reference") is False]
+    for key in mismatched:
+        print(f"Bank scores differ from the reference scorer: {key}")
+
+    if baseline is not None:
+        if baseline["meta"]["params"] != current["meta"]["params"]:
+            print("Warning: benchmark parameters differ from the baseline")
+        regressions = compare(baseline, current, args.threshold, args.min_delta_ms, args.metric)
+        return 1 if regressions or mismatched else 0
+    return 1 if mismatched else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())